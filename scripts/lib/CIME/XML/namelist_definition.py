@@ -88,6 +88,10 @@ class NamelistDefinition(EntryID):
         self._entry_types = {}
         self._group_names = CaseInsensitiveDict({})
         self._nodes = {}
+        # Results of split_type_string and get_input_pathname depend only on
+        # the (read-only) definition file, so they are cached per variable.
+        self._split_types = {}
+        self._input_pathnames = {}
 
     def set_nodes(self, skip_groups=None):
         """
@@ -244,6 +248,9 @@ class NamelistDefinition(EntryID):
         (which is an integer for character variables, otherwise `None`), and the
         size of the array (which is 1 for scalar variables).
         """
+        if name in self._split_types:
+            return self._split_types[name]
+
         type_string = self._entry_types[name]
 
         # 'char' is frequently used as an abbreviation of 'character'.
@@ -278,6 +285,7 @@ class NamelistDefinition(EntryID):
                        "In namelist definition, character variable {} had the non-integer string {!r} specified as a length.".format(name, length))
         else:
             max_len = None
+        self._split_types[name] = (type_, max_len, size)
         return type_, max_len, size
 
     @staticmethod
@@ -430,11 +438,14 @@ class NamelistDefinition(EntryID):
         return Namelist(groups)
 
     def get_input_pathname(self, name):
+        if name in self._input_pathnames:
+            return self._input_pathnames[name]
         node = self._nodes[name]
         if self.get_version() == 1.0:
             input_pathname = self.get(node, 'input_pathname')
         elif self.get_version() >= 2.0:
             input_pathname = self._get_node_element_info(node, "input_pathname")
+        self._input_pathnames[name] = input_pathname
         return(input_pathname)
 
     # pylint: disable=arguments-differ
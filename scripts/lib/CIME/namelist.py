@@ -290,14 +290,12 @@ def character_literal_to_string(literal):
     >>> character_literal_to_string('"' + '""Hello!""' + '"')
     '"Hello!"'
     """
-    # Figure out whether a quote or apostrophe is the delimiter.
-    delimiter = None
-    for char in literal:
-        if char in ("'", '"'):
-            delimiter = char
+    # Figure out whether a quote or apostrophe is the delimiter; it is the last
+    # one of either in the literal.
+    right_pos = max(literal.rfind("'"), literal.rfind('"'))
+    delimiter = literal[right_pos] if right_pos >= 0 else None
     # Find left and right edges of the string, extract middle.
     left_pos = literal.find(delimiter)
-    right_pos = literal.rfind(delimiter)
     new_literal = literal[left_pos+1:right_pos]
     # Replace escaped quote and apostrophe characters.
     return new_literal.replace(delimiter * 2, delimiter)
@@ -6,9 +6,8 @@
 # Disable these because this is our standard setup
 # pylint: disable=wildcard-import,unused-wildcard-import
 
-import datetime
+import calendar
 import re
-import hashlib
 
 from CIME.XML.standard_module_setup import *
 from CIME.namelist import Namelist, parse, \
@@ -21,11 +20,33 @@ from CIME.XML.grids import GRID_SEP
 
 logger = logging.getLogger(__name__)
 
-_var_ref_re = re.compile(r"\$(\{)?(?P<name>\w+)(?(1)\})")
+_var_ref_re = re.compile(r"\$(\{)?(?P<name>\w+)(?(1)\})", re.ASCII)
 
-_ymd_re = re.compile(r"%(?P<digits>[1-9][0-9]*)?y(?P<month>m(?P<day>d)?)?")
+_quote_chars = frozenset(('"', "'"))
 
-_stream_mct_file_template = """<?xml version="1.0"?>
+# Special values of file path variables that are not converted to absolute paths
+# NOTE - these are hard-coded here and a better way is to make these extensible
+_non_file_paths = frozenset(('UNSET', 'unset', 'idmap', 'idmap_ignore', 'null', 'create_mesh'))
+# Special values of file path variables that are not added to input data lists
+_unlisted_file_paths = frozenset(('UNSET', 'idmap', 'idmap_ignore'))
+
+def _unique_grid_paths(file_path):
+    """Split a GRID_SEP-delimited list of file paths, dropping repeated paths.
+
+    Grids often share a file, so repeats are removed (keeping the order of first
+    occurrence). Most file paths are for a single grid, so avoid building a
+    container for those.
+    """
+    if GRID_SEP in file_path:
+        return dict.fromkeys(file_path.split(GRID_SEP))
+    return (file_path,)
+
+_ymd_re = re.compile(r"%(?P<digits>[1-9][0-9]*)?y(?P<month>m(?P<day>d)?)?", re.ASCII)
+
+def _stream_mct_file_text(domain_varnames, domain_filepath, domain_filenames, #pylint:disable=too-many-arguments
+                          data_varnames, data_filepath, data_filenames, offset):
+    """Return the text of an MCT stream description file."""
+    return f"""<?xml version="1.0"?>
 <file id="stream" version="1.0">
 <dataSource>
    GENERIC
@@ -64,6 +85,9 @@ class NamelistGenerator(object):
 
     _streams_variables = []
 
+    # Days in each month (index 1-12) of a non-leap year.
+    _DAYS_NOLEAP = (None, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
     #pylint:disable=too-many-arguments
     def __init__(self, case, definition_files, files=None):
         """Construct a namelist generator.
@@ -77,6 +101,10 @@ class NamelistGenerator(object):
         # Save off important information from inputs.
         self._case = case
         self._din_loc_root = case.get_value('DIN_LOC_ROOT')
+        # Relative input file paths already resolved against DIN_LOC_ROOT
+        self._abs_path_cache = {}
+        # Whether each absolute input file path has been found on disk
+        self._file_exists_cache = {}
 
         # Create definition object - this will validate the xml schema in the definition file
         self._definition = NamelistDefinition(definition_files[0], files=files)
@@ -87,13 +115,29 @@ class NamelistGenerator(object):
         self._streams_variables = self._definition.get_per_stream_entries()
         for variable in self._streams_variables:
             self._streams_namelists[variable] = []
+        # (variable, values) pairs for the per-stream variables; clean_streams
+        # empties the lists in place, so these stay valid
+        self._streams_pairs = [(variable, self._streams_namelists[variable])
+                               for variable in self._streams_variables]
 
         # Create namelist object.
         self._namelist = Namelist()
+        # Whether self._namelist has passed validation since it was last changed
+        self._namelist_validated = False
+
+        # Values of case XML variables referenced from namelist defaults, only
+        # kept while init_defaults adds the defaults (None otherwise)
+        self._env_cache = None
+
+        # Lines known to be in each input data list, with the file size they
+        # were read or written at: {data_list_path: (size, set of lines)}
+        self._input_data_lines = {}
 
         # entries for which we should potentially call add_default (variables that do not
         # set skip_default_entry)
         self._default_nodes = []
+        # the same entries, keyed by namelist group name
+        self._default_nodes_by_group = {}
 
     # Define __enter__ and __exit__ so that we can use this as a context manager
     def __enter__(self):
@@ -121,6 +165,11 @@ class NamelistGenerator(object):
 
         # Determine the array of entry nodes that will be acted upon
         self._default_nodes = self._definition.set_nodes(skip_groups=skip_groups)
+        entry_ids = [self._definition.get(entry, "id") for entry in self._default_nodes]
+        group_names = [self._definition.get_group_name(entry) for entry in self._default_nodes]
+        self._default_nodes_by_group = {}
+        for entry, group_name in zip(self._default_nodes, group_names):
+            self._default_nodes_by_group.setdefault(group_name, []).append(entry)
 
         # Add attributes to definition object
         self._definition.add_attributes(config)
@@ -140,14 +189,20 @@ class NamelistGenerator(object):
             # Merge into existing settings (earlier settings have precedence
             # over later settings).
             self._namelist.merge_nl(new_namelist)
+            self._namelist_validated = False
 
         if not skip_entry_loop:
-            for entry in self._default_nodes:
-                group_name = self._definition.get_group_name(entry)
-                if not group_name in skip_default_for_groups:
-                    self.add_default(self._definition.get(entry, "id"))
-
-        return [self._definition.get(entry, "id") for entry in self._default_nodes]
+            # The case is not modified while the defaults are added, so each
+            # referenced XML variable only needs to be looked up once
+            self._env_cache = {}
+            try:
+                for entry_id, group_name in zip(entry_ids, group_names):
+                    if not group_name in skip_default_for_groups:
+                        self.add_default(entry_id)
+            finally:
+                self._env_cache = None
+
+        return entry_ids
 
     def add_defaults_for_group(self, group):
         """Call add_default for namelist variables in the given group
@@ -158,10 +213,8 @@ class NamelistGenerator(object):
         This must be called after init_defaults. It is often paired with use of
         skip_default_for_groups in the init_defaults call.
         """
-        for entry in self._default_nodes:
-            group_name = self._definition.get_group_name(entry)
-            if group_name == group:
-                self.add_default(self._definition.get(entry, "id"))
+        for entry in self._default_nodes_by_group.get(group, []):
+            self.add_default(self._definition.get(entry, "id"))
 
     def confirm_group_is_empty(self, group_name, errmsg):
         """Confirms that no values have been added to the given group
@@ -190,10 +243,9 @@ class NamelistGenerator(object):
 
         Does nothing if the string appears to be quoted already.
         """
-        if string == "" or \
-           (string[0] not in ('"', "'") or string[0] != string[-1]):
-            string = string_to_character_literal(string)
-        return string
+        if string and string[0] in _quote_chars and string[0] == string[-1]:
+            return string
+        return string_to_character_literal(string)
 
     def _to_python_value(self, name, literals):
         """Transform a literal list as needed for `get_value`."""
@@ -203,11 +255,11 @@ class NamelistGenerator(object):
         else:
             return ""
 
-        for i, scalar in enumerate(values):
-            if scalar == '':
-                values[i] = None
-            elif var_type == 'character':
-                values[i] = character_literal_to_string(scalar)
+        if var_type == 'character':
+            values = [None if scalar == '' else character_literal_to_string(scalar)
+                      for scalar in values]
+        else:
+            values = [None if scalar == '' else scalar for scalar in values]
 
         if var_size == 1:
             return values[0]
@@ -224,15 +276,19 @@ class NamelistGenerator(object):
         if var_size == 1 and not isinstance(values, list):
             values = [values]
 
-        for i, scalar in enumerate(values):
-            if scalar is None:
-                values[i] = ""
-            elif var_type == 'character':
-                expect(not isinstance(scalar, list), name)
-                values[i] = self.quote_string(scalar)
+        if var_type == 'character':
+            values = ["" if scalar is None else self._quote_scalar(name, scalar)
+                      for scalar in values]
+        else:
+            values = ["" if scalar is None else scalar for scalar in values]
 
         return compress_literal_list(values)
 
+    def _quote_scalar(self, name, scalar):
+        """Quote one element of a character variable's value for `set_value`."""
+        expect(not isinstance(scalar, list), name)
+        return self.quote_string(scalar)
+
     def get_value(self, name):
         """Get the current value of a given namelist variable.
 
@@ -275,6 +331,7 @@ class NamelistGenerator(object):
         _, _, var_size, = self._definition.split_type_string(name)
         if len(literals) > 0 and literals[0] is not None:
             self._namelist.set_variable_value(var_group, name, literals, var_size)
+            self._namelist_validated = False
 
     def get_default(self, name, config=None, allow_none=False):
         """Get the value of a variable from the namelist definition file.
@@ -314,21 +371,24 @@ class NamelistGenerator(object):
         var_type,_,_ = self._definition.split_type_string(name)
 
         for i, scalar in enumerate(default):
+            # Most defaults contain no variable references at all.
+            if "$" not in scalar:
+                continue
             # Skip single-quoted strings.
-            if var_type == 'character' and scalar != '' and \
-               scalar[0] == scalar[-1] == "'":
+            if var_type == 'character' and scalar[0] == scalar[-1] == "'":
                 continue
+            # Search from the start again after each substitution, so references
+            # inside substituted values are expanded too.
             match = _var_ref_re.search(scalar)
             while match:
-                env_val = self._case.get_value(match.group('name'))
-                if env_val is not None:
-                    scalar = scalar.replace(match.group(0), str(env_val), 1)
-                    match = _var_ref_re.search(scalar)
-                else:
+                env_val = self._env_lookup(match.group('name'))
+                if env_val is None:
                     scalar = None
-                    logger.warning("Namelist default for variable {} refers to unknown XML variable {}.".
-                       format(name, match.group('name')))
-                    match = None
+                    logger.warning("Namelist default for variable %s refers to unknown XML variable %s.",
+                                   name, match.group('name'))
+                    break
+                scalar = scalar.replace(match.group(0), str(env_val), 1)
+                match = _var_ref_re.search(scalar)
             default[i] = scalar
 
         # Deal with missing quotes.
@@ -343,19 +403,27 @@ class NamelistGenerator(object):
 
         return default
 
+    def _env_lookup(self, name):
+        """Return the value of case XML variable `name`, cached during init_defaults."""
+        if self._env_cache is None:
+            return self._case.get_value(name)
+        if name not in self._env_cache:
+            self._env_cache[name] = self._case.get_value(name)
+        return self._env_cache[name]
+
     def get_streams(self):
         """Get a list of all streams used for the current data model  mode."""
         return self.get_default("streamslist")
 
     def clean_streams(self):
-        for variable in self._streams_variables:
-            self._streams_namelists[variable] = []
-        self._streams_namelists["streams"] = []
+        for values in self._streams_namelists.values():
+            del values[:]
 
     def new_instance(self):
         """ Clean the object just enough to introduce a new instance """
         self.clean_streams()
         self._namelist.clean_groups()
+        self._namelist_validated = False
 
     def _sub_fields(self, varnames):
         """Substitute indicators with given values in a list of fields.
@@ -384,16 +452,16 @@ class NamelistGenerator(object):
         """
         lines = varnames.split("\n")
         new_lines = []
+        glc_suffixes = None
         for line in lines:
             if not line:
                 continue
             if "%glc" in line:
-                if self._case.get_value('GLC_NEC') == 0:
-                    glc_nec_indices = []
-                else:
-                    glc_nec_indices = range(self._case.get_value('GLC_NEC')+1)
-                for i in glc_nec_indices:
-                    new_lines.append(line.replace("%glc", "{:02d}".format(i)))
+                if glc_suffixes is None:
+                    # Only look up GLC_NEC when a line actually needs it.
+                    glc_nec = self._case.get_value('GLC_NEC')
+                    glc_suffixes = ["{:02d}".format(i) for i in range(glc_nec+1)] if glc_nec else []
+                new_lines.extend(line.replace("%glc", suffix) for suffix in glc_suffixes)
             else:
                 new_lines.append(line)
         return "\n".join(new_lines)
@@ -405,15 +473,10 @@ class NamelistGenerator(object):
         The `year` argument gives the year for which to request the number of
         days, in a Gregorian calendar. Defaults to `1` (not a leap year).
         """
-        month_start = datetime.date(year, month, 1)
-        if month == 12:
-            next_year = year+1
-            next_month = 1
-        else:
-            next_year = year
-            next_month = month + 1
-        next_month_start = datetime.date(next_year, next_month, 1)
-        return (next_month_start - month_start).days
+        days = NamelistGenerator._DAYS_NOLEAP[month]
+        if month == 2 and calendar.isleap(year):
+            days += 1
+        return days
 
     def _sub_paths(self, filenames, year_start, year_end):
         """Substitute indicators with given values in a list of filenames.
@@ -445,31 +508,29 @@ class NamelistGenerator(object):
         lines = [line for line in filenames.split("\n") if line]
         new_lines = []
         for line in lines:
-            match = _ymd_re.search(filenames)
+            match = _ymd_re.search(line)
             if match is None:
                 new_lines.append(line)
                 continue
-            if match.group('digits'):
-                year_format = "{:0"+match.group('digits')+"d}"
-            else:
-                year_format = "{:04d}"
+            digits = int(match.group('digits') or 4)
+            # Slice around the matched span, so only the rest of the line is
+            # searched for repeats of the indicator; each date is then joined
+            # in place of the indicator without rescanning the line.
+            start, end = match.span()
+            parts = [line[:start]] + line[end:].split(match.group(0))
+            has_day = bool(match.group('day'))
+            has_month = bool(match.group('month'))
             for year in range(year_start, year_end+1):
-                if match.group('day'):
+                if has_day:
                     for month in range(1, 13):
                         days = self._days_in_month(month)
                         for day in range(1, days+1):
-                            date_string = (year_format + "-{:02d}-{:02d}").format(year, month, day)
-                            new_line = line.replace(match.group(0), date_string)
-                            new_lines.append(new_line)
-                elif match.group('month'):
+                            new_lines.append(f"{year:0{digits}d}-{month:02d}-{day:02d}".join(parts))
+                elif has_month:
                     for month in range(1, 13):
-                        date_string = (year_format + "-{:02d}").format(year, month)
-                        new_line = line.replace(match.group(0), date_string)
-                        new_lines.append(new_line)
+                        new_lines.append(f"{year:0{digits}d}-{month:02d}".join(parts))
                 else:
-                    date_string = year_format.format(year)
-                    new_line = line.replace(match.group(0), date_string)
-                    new_lines.append(new_line)
+                    new_lines.append(f"{year:0{digits}d}".join(parts))
         return "\n".join(new_lines)
 
     @staticmethod
@@ -477,9 +538,7 @@ class NamelistGenerator(object):
         expect(delimiter and not " " in delimiter, "Missing or badly formed delimiter")
         pred = "<{}>".format(delimiter)
         postd = "</{}>".format(delimiter)
-        for n,_ in enumerate(list_to_deliminate):
-            list_to_deliminate[n] = pred + list_to_deliminate[n].strip() + postd
-        return "\n      ".join(list_to_deliminate)
+        return "\n      ".join(pred + item.strip() + postd for item in list_to_deliminate)
 
 
     def create_stream_file_and_update_shr_strdata_nml(self, config, caseroot, #pylint:disable=too-many-locals
@@ -540,7 +599,7 @@ class NamelistGenerator(object):
                 domain_filepath = data_filepath
                 domain_filenames = data_filenames.splitlines()[0]
 
-            stream_file_text = _stream_mct_file_template.format(
+            stream_file_text = _stream_mct_file_text(
                 domain_varnames=domain_varnames,
                 domain_filepath=domain_filepath,
                 domain_filenames=domain_filenames,
@@ -553,26 +612,27 @@ class NamelistGenerator(object):
             with open(stream_path, 'w') as stream_file:
                 stream_file.write(stream_file_text)
 
-        lines_hash = self._get_input_file_hash(data_list_path)
-        with open(data_list_path, 'a') as input_data_list:
-            for i, filename in enumerate(domain_filenames.split("\n")):
-                if filename.strip() == '':
-                    continue
-                filepath, filename = os.path.split(filename)
-                if not filepath:
-                    filepath = os.path.join(domain_filepath, filename.strip())
-                string = "domain{:d} = {}\n".format(i+1, filepath)
-                hashValue = hashlib.md5(string.rstrip().encode('utf-8')).hexdigest()
-                if hashValue not in lines_hash:
-                    input_data_list.write(string)
-            for i, filename in enumerate(data_filenames.split("\n")):
-                if filename.strip() == '':
-                    continue
-                filepath = os.path.join(data_filepath, filename.strip())
-                string = "file{:d} = {}\n".format(i+1, filepath)
-                hashValue = hashlib.md5(string.rstrip().encode('utf-8')).hexdigest()
-                if hashValue not in lines_hash:
-                    input_data_list.write(string)
+        existing_lines = self._get_input_file_lines(data_list_path)
+        # Collect new lines and append them with a single write.
+        new_lines = []
+        for i, filename in enumerate(domain_filenames.split("\n")):
+            filename = filename.strip()
+            if not filename:
+                continue
+            filepath, filename = os.path.split(filename)
+            string = "domain{:d} = {}".format(i+1, os.path.join(filepath or domain_filepath, filename))
+            if string not in existing_lines:
+                new_lines.append(string + "\n")
+                existing_lines.add(string)
+        for i, filename in enumerate(data_filenames.split("\n")):
+            filename = filename.strip()
+            if not filename:
+                continue
+            string = "file{:d} = {}".format(i+1, os.path.join(data_filepath, filename))
+            if string not in existing_lines:
+                new_lines.append(string + "\n")
+                existing_lines.add(string)
+        self._append_input_file_lines(data_list_path, new_lines, existing_lines)
         self.update_shr_strdata_nml(config, stream, stream_path)
 
     def update_shr_strdata_nml(self, config, stream, stream_path):
@@ -594,22 +654,25 @@ class NamelistGenerator(object):
                                                    year_align, year_start,
                                                    year_end)
         self._streams_namelists["streams"].append(stream_string)
-        for variable in self._streams_variables:
+        for variable, values in self._streams_pairs:
             default = self.get_default(variable, config)
             expect(len(default) == 1,
                    "Stream {} had multiple settings for variable {}.".format(stream, variable))
-            self._streams_namelists[variable].append(default[0])
+            values.append(default[0])
 
     def set_abs_file_path(self, file_path):
         """If `file_path` is relative, make it absolute using `DIN_LOC_ROOT`.
 
         If an absolute path is input, it is returned unchanged.
         """
-        if os.path.isabs(file_path):
-            return file_path
-        else:
-            fullpath = os.path.join(self._din_loc_root, file_path)
-            return fullpath
+        fullpath = self._abs_path_cache.get(file_path)
+        if fullpath is None:
+            if os.path.isabs(file_path):
+                fullpath = file_path
+            else:
+                fullpath = os.path.join(self._din_loc_root, file_path)
+            self._abs_path_cache[file_path] = fullpath
+        return fullpath
 
     def add_default(self, name, value=None, ignore_abs_path=None):
         """Add a value for the specified variable to the namelist.
@@ -666,6 +729,15 @@ class NamelistGenerator(object):
 
         # Set the new value.
         self._namelist.set_variable_value(group, name, current_literals, var_size)
+        self._namelist_validated = False
+
+    def _file_exists(self, file_path):
+        """Return os.path.exists(file_path), checking each path only once per generator"""
+        exists = self._file_exists_cache.get(file_path)
+        if exists is None:
+            exists = os.path.exists(file_path)
+            self._file_exists_cache[file_path] = exists
+        return exists
 
     def _convert_to_abs_file_path(self, file_path, name):
         """Convert the given file_path to an abs file path and return the result
@@ -676,24 +748,22 @@ class NamelistGenerator(object):
         portion as a separate file, then return a new GRID_SEP-delimited string.
 
         """
-        abs_file_paths = []
-        # In most cases, the list created by the following split will only contain a
-        # single element, but this split is needed to handle grid-related files for
-        # components with multiple grids (e.g., GLC).
-        for one_file_path in file_path.split(GRID_SEP):
-            # NOTE - these are hard-coded here and a better way is to make these extensible
-            if one_file_path == 'UNSET' or one_file_path == 'idmap' or one_file_path == 'idmap_ignore' or one_file_path == 'unset':
-                abs_file_paths.append(one_file_path)
-            elif one_file_path in ('null','create_mesh'):
-                abs_file_paths.append(one_file_path)
-            else:
-                one_abs_file_path = self.set_abs_file_path(one_file_path)
-                if not os.path.exists(one_abs_file_path):
-                    logger.warning("File not found: {} = {}, will attempt to download in check_input_data phase".format(
-                        name, one_abs_file_path))
-                abs_file_paths.append(one_abs_file_path)
-
-        return GRID_SEP.join(abs_file_paths)
+        # In most cases, file_path is a single file, but splitting is needed to handle
+        # grid-related files for components with multiple grids (e.g., GLC).
+        if GRID_SEP not in file_path:
+            return self._convert_one_to_abs_file_path(file_path, name)
+        return GRID_SEP.join(self._convert_one_to_abs_file_path(one_file_path, name)
+                             for one_file_path in file_path.split(GRID_SEP))
+
+    def _convert_one_to_abs_file_path(self, file_path, name):
+        """Convert a single file_path (without GRID_SEP) to an abs file path"""
+        if file_path in _non_file_paths:
+            return file_path
+        abs_file_path = self.set_abs_file_path(file_path)
+        if not self._file_exists(abs_file_path):
+            logger.warning("File not found: %s = %s, will attempt to download in check_input_data phase",
+                           name, abs_file_path)
+        return abs_file_path
 
     def create_shr_strdata_nml(self):
         """Set defaults for `shr_strdata_nml` variables other than the variable domainfile """
@@ -701,44 +771,70 @@ class NamelistGenerator(object):
         if self.get_value("datamode") != 'NULL':
             self.add_default("streams",
                              value=self._streams_namelists["streams"])
-            for variable in self._streams_variables:
-                self.add_default(variable,
-                                 value=self._streams_namelists[variable])
+            for variable, values in self._streams_pairs:
+                self.add_default(variable, value=values)
 
     def get_group_variables(self, group_name):
         return self._namelist.get_group_variables(group_name)
 
-    def _get_input_file_hash(self, data_list_path):
-        lines_hash = set()
-        if os.path.isfile(data_list_path):
+    def _get_input_file_lines(self, data_list_path):
+        """Return the set of lines already in the given input data list
+
+        The set is kept on the generator, and the file is only read again if
+        its size no longer matches the size recorded with the set (e.g.,
+        because it was removed or appended to by someone else).
+        """
+        size = os.path.getsize(data_list_path) if os.path.isfile(data_list_path) else None
+        cached = self._input_data_lines.get(data_list_path)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+
+        existing_lines = set()
+        if size is not None:
             with open(data_list_path, "r") as input_data_list:
-                for line in input_data_list:
-                    hashValue = hashlib.md5(line.rstrip().encode('utf-8')).hexdigest()
-                    logger.debug( "Found line {} with hash {}".format(line,hashValue))
-                    lines_hash.add(hashValue)
-        return lines_hash
+                existing_lines = set(line.rstrip() for line in input_data_list.read().splitlines())
+            logger.debug("Found %d lines in %s", len(existing_lines), data_list_path)
+        self._input_data_lines[data_list_path] = (size, existing_lines)
+        return existing_lines
+
+    def _append_input_file_lines(self, data_list_path, new_lines, existing_lines):
+        """Append new_lines to the given input data list
+
+        `existing_lines` must already include `new_lines`; it is recorded as the
+        file's contents. The file is not touched if there is nothing to add and
+        it already exists.
+        """
+        if not new_lines and os.path.exists(data_list_path):
+            return
+        with open(data_list_path, "a") as input_data_list:
+            input_data_list.write("".join(new_lines))
+        self._input_data_lines[data_list_path] = (os.path.getsize(data_list_path), existing_lines)
 
     def _write_input_files(self, data_list_path):
         """Write input data files to list."""
+        # First gather all variables that are paths to input data files, so
+        # that the loop writing lines only deals with their values.
+        path_variables = []
+        for group_name in self._namelist.get_group_names():
+            for variable_name in self._namelist.get_variable_names(group_name):
+                input_pathname = self._definition.get_input_pathname(variable_name)
+                if input_pathname is not None:
+                    literals = self._namelist.get_variable_value(group_name, variable_name)
+                    path_variables.append((variable_name, input_pathname, literals))
+
         # append to input_data_list file
-        lines_hash = self._get_input_file_hash(data_list_path)
-        with open(data_list_path, "a") as input_data_list:
-            for group_name in self._namelist.get_group_names():
-                for variable_name in self._namelist.get_variable_names(group_name):
-                    input_pathname = self._definition.get_node_element_info(variable_name, "input_pathname")
-                    if input_pathname is not None:
-                        # This is where we end up for all variables that are paths
-                        # to input data files.
-                        literals = self._namelist.get_variable_value(group_name, variable_name)
-                        for literal in literals:
-                            file_path = character_literal_to_string(literal)
-                            self._add_file_to_input_data_list(input_data_list=input_data_list,
-                                                              variable_name=variable_name,
-                                                              file_path=file_path,
-                                                              input_pathname=input_pathname,
-                                                              lines_hash=lines_hash)
-
-    def _add_file_to_input_data_list(self, input_data_list, variable_name, file_path, input_pathname, lines_hash):
+        existing_lines = self._get_input_file_lines(data_list_path)
+        new_lines = []
+        for variable_name, input_pathname, literals in path_variables:
+            for literal in literals:
+                self._add_file_to_input_data_list(new_lines=new_lines,
+                                                  variable_name=variable_name,
+                                                  file_path=character_literal_to_string(literal),
+                                                  input_pathname=input_pathname,
+                                                  existing_lines=existing_lines)
+        self._append_input_file_lines(data_list_path, new_lines, existing_lines)
+
+    def _add_file_to_input_data_list(self, new_lines, variable_name, file_path, input_pathname, existing_lines):
         """Add one file to the input data list, if needed
 
         It's possible that file_path actually contains multiple files delimited by
@@ -747,30 +843,38 @@ class NamelistGenerator(object):
         portion as a separate file.
 
         Args:
-        - input_data_list: file handle
+        - new_lines (list): lines to be appended to the input data list; a line
+          for this file is added here if needed
         - variable_name (string): name of variable to add
         - file_path (string): path to file
         - input_pathname (string): whether this is an absolute or relative path
-        - lines_hash (set): set of hashes of lines already in the given input data list
+        - existing_lines (set): set of lines already in (or about to be added to) the
+          given input data list; updated with any line added to new_lines
 
         """
-        for one_file_path in file_path.split(GRID_SEP):
-            # NOTE - these are hard-coded here and a better way is to make these extensible
-            if one_file_path == 'UNSET' or one_file_path == 'idmap' or one_file_path == 'idmap_ignore':
+        # Only looked up (once) if a relative path needs it
+        root_dir = None
+        line_prefix = variable_name + " = "
+        is_abs = input_pathname == 'abs'
+        is_rel = input_pathname.startswith('rel:')
+        for one_file_path in _unique_grid_paths(file_path):
+            if one_file_path in _unlisted_file_paths:
                 continue
-            if input_pathname == 'abs':
+            if is_abs:
                 # No further mangling needed for absolute paths.
                 # At this point, there are overwrites that should be ignored
                 if not os.path.isabs(one_file_path):
                     continue
                 else:
                     pass
-            elif input_pathname.startswith('rel:'):
+            elif is_rel:
                 # The part past "rel" is the name of a variable that
                 # this variable specifies its path relative to.
-                root_var = input_pathname[4:]
-                root_dir = self.get_value(root_var)
-                one_file_path = os.path.join(root_dir, one_file_path)
+                if root_dir is None:
+                    # With a trailing separator, joining is a plain concatenation
+                    root_dir = os.path.join(self.get_value(input_pathname[4:]), "")
+                if not os.path.isabs(one_file_path):
+                    one_file_path = root_dir + one_file_path
             else:
                 expect(False,
                        "Bad input_pathname value: {}.".format(input_pathname))
@@ -780,13 +884,19 @@ class NamelistGenerator(object):
             # Note that the same variable name is repeated for each file. This currently
             # seems okay for check_input_data, but if it becomes a problem, we could
             # change this, e.g., appending an index to the end of variable_name.
-            string = "{} = {}".format(variable_name, one_file_path)
-            hashValue = hashlib.md5(string.rstrip().encode('utf-8')).hexdigest()
-            if hashValue not in lines_hash:
-                logger.debug("Adding line {} with hash {}".format(string,hashValue))
-                input_data_list.write(string+"\n")
+            string = (line_prefix + one_file_path).rstrip()
+            if string not in existing_lines:
+                logger.debug("Adding line %s", string)
+                new_lines.append(string+"\n")
+                existing_lines.add(string)
             else:
-                logger.debug("Line already in file {}".format(string))
+                logger.debug("Line already in file %s", string)
+
+    def _validate_namelist(self):
+        """Validate the namelist against the definition, unless it is unchanged since last time"""
+        if not self._namelist_validated:
+            self._definition.validate(self._namelist)
+            self._namelist_validated = True
 
     def write_output_file(self, namelist_file, data_list_path=None, groups=None, sorted_groups=True):
         """Write out the namelists and input data files.
@@ -796,15 +906,13 @@ class NamelistGenerator(object):
         `data_list_path` argument is the location of the `*.input_data_list`
         file, which will have the input data files added to it.
         """
-        self._definition.validate(self._namelist)
+        self._validate_namelist()
         if groups is None:
             groups = self._namelist.get_group_names()
 
-        # remove groups that are never in namelist file
-        if "modelio" in groups:
-            groups.remove("modelio")
-        if "seq_maps" in groups:
-            groups.remove("seq_maps")
+        # remove groups that are never in namelist file (without modifying the
+        # caller's list)
+        groups = [group for group in groups if group not in ("modelio", "seq_maps")]
 
         # write namelist file
         self._namelist.write(namelist_file, groups=groups, sorted_groups=sorted_groups)
@@ -833,7 +941,7 @@ class NamelistGenerator(object):
 
     def write_nuopc_config_file(self, filename, data_list_path=None, sorted_groups=False):
         """ Write the nuopc config file"""
-        self._definition.validate(self._namelist)
+        self._validate_namelist()
         groups = self._namelist.get_group_names()
         # write the config file
         self._namelist.write_nuopc(filename, groups=groups, sorted_groups=sorted_groups)
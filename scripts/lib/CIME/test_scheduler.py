@@ -8,11 +8,11 @@ phases. All other phases need to handle their own status because
 they can be run outside the context of TestScheduler.
 """
 
-import traceback, stat, threading, time, glob
-from collections import OrderedDict
+import traceback, stat, threading, time
 
 from CIME.XML.standard_module_setup import *
 import six
+from six.moves.queue import Queue, Empty
 from get_tests import get_recommended_test_time, get_build_groups
 from CIME.utils import append_status, append_testlog, TESTS_FAILED_ERR_CODE, parse_test_name, get_full_test_name, get_model, \
     convert_to_seconds, get_cime_root, get_project, get_timestamp, get_python_libs_root
@@ -39,22 +39,73 @@ TEST_START = "INIT" # Special pseudo-phase just for test_scheduler bookkeeping
 PHASES = [TEST_START, CREATE_NEWCASE_PHASE, XML_PHASE, SETUP_PHASE,
           SHAREDLIB_BUILD_PHASE, MODEL_BUILD_PHASE, RUN_PHASE] # Order matters
 
+# Phases that tests other than the first in a build group can only do after the
+# first test has done them
+_BUILD_GROUP_DEP_PHASES = frozenset([XML_PHASE, SHAREDLIB_BUILD_PHASE, MODEL_BUILD_PHASE])
+
+# P<procs>[x<threads>] case option
+_PECOUNT_CASEOPT_RE = re.compile(r"P([^x]*)(?:x(.*))?$")
+
+# L<stop option letter><stop n> case option
+_STOP_CASEOPT_RE = re.compile(r"L([A-Za-z])([0-9]*)")
+_STOP_OPTIONS = {"y":"nyears", "m":"nmonths", "d":"ndays", "h":"nhours",
+                 "s":"nseconds", "n":"nsteps"}
+
+# A<pio numtasks>[x<pio stride>] case option
+_ASYNC_IO_CASEOPT_RE = re.compile(r"A([0-9]+)x?([0-9])*")
+
+# (NTASKS, NTHRDS, ROOTPE) parameter names of each component for the R case option
+_PTS_MODE_PES_PARAMS = tuple(("NTASKS_"+comp, "NTHRDS_"+comp, "ROOTPE_"+comp)
+                             for comp in ["ATM","LND","ICE","OCN","CPL","GLC","ROF","WAV"])
+
+# Case options that set a single test parameter in _xml_phase
+_XML_PHASE_FLAG_CASEOPTS = {"D"  : ("DEBUG", "TRUE"),
+                            "E"  : ("USE_ESMF_LIB", "TRUE"),
+                            "CG" : ("CALENDAR", "GREGORIAN")}
+
+# Leading letters of case options that _xml_phase leaves alone: I marks tests
+# that would otherwise have the same name, the rest are handled in create_newcase
+_XML_PHASE_IGNORED_CASEOPTS = frozenset("IMPNCVG")
+
+# Seconds to wait before each retry of a command that failed with "bad interpreter"
+_BAD_INTERPRETER_RETRY_DELAYS = (0.1, 0.2, 0.4, 0.8, 1.6)
+
+# Final test statuses for which no TestStatus is copied to the generated baselines
+_SKIP_BASELINE_STATUSES = frozenset([TEST_PASS_STATUS, TEST_PEND_STATUS])
+
+_PARSED_TEST_NAMES = {}
+###############################################################################
+def _parse_test_name(test_name):
+###############################################################################
+    """
+    Memoized parse_test_name. The same test names are parsed over and over
+    again by the scheduler, so only split each name once. The list fields of
+    the result are copied so callers are free to modify them.
+
+    >>> _parse_test_name('ERS_D_P1.fe12_123.JGF')
+    ['ERS', ['D', 'P1'], 'fe12_123', 'JGF', None, None, None]
+    >>> _parse_test_name('ERS_D_P1.fe12_123.JGF')[1].append('N2')
+    >>> _parse_test_name('ERS_D_P1.fe12_123.JGF')
+    ['ERS', ['D', 'P1'], 'fe12_123', 'JGF', None, None, None]
+    """
+    if test_name not in _PARSED_TEST_NAMES:
+        _PARSED_TEST_NAMES[test_name] = tuple(parse_test_name(test_name))
+
+    return [list(item) if isinstance(item, list) else item for item in _PARSED_TEST_NAMES[test_name]]
+
 ###############################################################################
 def _translate_test_names_for_new_pecount(test_names, force_procs, force_threads):
 ###############################################################################
     new_test_names = []
     caseopts = []
     for test_name in test_names:
-        testcase, caseopts, grid, compset, machine, compiler, testmods = parse_test_name(test_name)
+        testcase, caseopts, grid, compset, machine, compiler, testmods = _parse_test_name(test_name)
         rewrote_caseopt = False
         if caseopts is not None:
             for idx, caseopt in enumerate(caseopts):
-                if caseopt.startswith("P"):
-                    caseopt = caseopt[1:]
-                    if "x" in caseopt:
-                        old_procs, old_thrds = caseopt.split("x")
-                    else:
-                        old_procs, old_thrds = caseopt, None
+                match = _PECOUNT_CASEOPT_RE.match(caseopt)
+                if match:
+                    old_procs, old_thrds = match.groups()
 
                     new_procs = force_procs if force_procs is not None else old_procs
                     new_thrds = force_threads if force_threads is not None else old_thrds
@@ -82,8 +133,10 @@ _TIME_CACHE = {}
 ###############################################################################
 def _get_time_est(test, baseline_root, as_int=False, use_cache=False, raw=False):
 ###############################################################################
-    if test in _TIME_CACHE and use_cache:
-        return _TIME_CACHE[test]
+    # The estimate depends on where and in what form it was requested
+    cache_key = (test, baseline_root, as_int, raw)
+    if use_cache and cache_key in _TIME_CACHE:
+        return _TIME_CACHE[cache_key]
 
     recommended_time = get_recommended_test_time_based_on_past(baseline_root, test, raw=raw)
 
@@ -97,14 +150,15 @@ def _get_time_est(test, baseline_root, as_int=False, use_cache=False, raw=False)
             recommended_time = convert_to_seconds(recommended_time)
 
     if use_cache:
-        _TIME_CACHE[test] = recommended_time
+        _TIME_CACHE[cache_key] = recommended_time
 
     return recommended_time
 
 ###############################################################################
 def _order_tests_by_runtime(tests, baseline_root):
 ###############################################################################
-    tests.sort(key=lambda x: _get_time_est(x, baseline_root, as_int=True, use_cache=True, raw=True), reverse=True)
+    time_ests = {test: _get_time_est(test, baseline_root, as_int=True, use_cache=True, raw=True) for test in tests}
+    tests.sort(key=time_ests.__getitem__, reverse=True)
 
 ###############################################################################
 class TestScheduler(object):
@@ -131,6 +185,7 @@ class TestScheduler(object):
         self._save_timing     = save_timing
         self._queue           = queue
         self._test_data       = {} if test_data is None else test_data # Format:  {test_name -> {data_name -> data}}
+        self._test_options    = {test: data.get("options") or {} for test, data in self._test_data.items()}
         self._mpilib          = mpilib  # allow override of default mpilib
         self._completed_tests = 0
         self._input_dir       = input_dir
@@ -139,6 +194,9 @@ class TestScheduler(object):
         self._allow_pnl       = allow_pnl
         self._non_local       = non_local
         self._build_groups    = []
+        self._test_mod_files  = {} # (driver, component, modspath) -> (test_mod_file, error)
+        self._total_pes       = {} # test -> TOTALPES of the case
+        self._config_tests    = None # Tests, read on first use
         self._workflow        = workflow
 
         self._mail_user = mail_user
@@ -215,6 +273,14 @@ class TestScheduler(object):
         self._baseline_root = os.path.abspath(baseline_root) if baseline_root is not None \
                               else self._machobj.get_value("BASELINE_ROOT")
 
+        # Machine settings copied unresolved into every test's env_test.xml
+        self._ccsm_cprnc = self._machobj.get_value("CCSM_CPRNC", resolved=False)
+        self._tput_tolerance = self._machobj.get_value("TEST_TPUT_TOLERANCE", resolved=False)
+
+        # Directory holding each test's generated baseline, None if not generating
+        self._baseline_gen_dir = os.path.join(self._baseline_root, self._baseline_gen_name) \
+                                 if self._baseline_gen_name else None
+
         if baseline_cmp_name or baseline_gen_name:
             if self._baseline_cmp_name:
                 full_baseline_dir = os.path.join(self._baseline_root, self._baseline_cmp_name)
@@ -223,12 +289,15 @@ class TestScheduler(object):
 
             # the following is to assure that the existing generate directory is not overwritten
             if self._baseline_gen_name:
-                full_baseline_dir = os.path.join(self._baseline_root, self._baseline_gen_name)
-                existing_baselines = []
-                for test_name in test_names:
-                    test_baseline = os.path.join(full_baseline_dir, test_name)
-                    if os.path.isdir(test_baseline):
-                        existing_baselines.append(test_baseline)
+                full_baseline_dir = self._baseline_gen_dir
+                # Read the baseline directory once rather than stat'ing every test baseline
+                try:
+                    baseline_dirs = {entry.name for entry in os.scandir(full_baseline_dir) if entry.is_dir()}
+                except OSError:
+                    baseline_dirs = set()
+
+                existing_baselines = [os.path.join(full_baseline_dir, test_name)
+                                      for test_name in test_names if test_name in baseline_dirs]
 
                 expect(allow_baseline_overwrite or len(existing_baselines) == 0,
                        "Baseline directories already exists {}\n" \
@@ -240,11 +309,27 @@ class TestScheduler(object):
         # This is the only data that multiple threads will simultaneously access
         # Each test has it's own value and setting/retrieving items from a dict
         # is atomic, so this should be fine to use without mutex.
-        # name -> (phase, status)
-        self._tests = OrderedDict()
+        # name -> (phase, status), in the order the tests will be started
+        self._tests = {}
         for test_name in test_names:
             self._tests[test_name] = (TEST_START, TEST_PASS_STATUS)
 
+        # Case ids and directories do not change once the test id and baseline
+        # names are known, so compute them once
+        baseline_action_code = ""
+        if self._baseline_gen_name:
+            baseline_action_code += "G"
+        if self._baseline_cmp_name:
+            baseline_action_code += "C"
+        if len(baseline_action_code) > 0:
+            case_id_suffix = ".{}.{}".format(baseline_action_code, self._test_id)
+        else:
+            case_id_suffix = ".{}".format(self._test_id)
+
+        self._case_ids = {test: test + case_id_suffix for test in self._tests}
+        self._test_dirs = {test: os.path.join(self._test_root, case_id)
+                           for test, case_id in self._case_ids.items()}
+
         # Oversubscribe by 1/4
         if proc_pool is None:
             pes = int(self._machobj.get_value("MAX_TASKS_PER_NODE"))
@@ -255,6 +340,8 @@ class TestScheduler(object):
         logger.info("create_test will use up to {} cores simultaneously".format(self._proc_pool))
 
         self._procs_avail = self._proc_pool
+        # Tests whose phase thread has finished, filled by _run_consumer
+        self._finished_tests = Queue()
 
         # Setup phases
         self._phases = list(PHASES)
@@ -266,6 +353,8 @@ class TestScheduler(object):
         if self._no_run:
             self._phases.remove(RUN_PHASE)
 
+        self._phase_idx = {phase: idx for idx, phase in enumerate(self._phases)}
+
         if use_existing:
             for test in self._tests:
                 with TestStatus(self._get_test_dir(test)) as ts:
@@ -282,25 +371,32 @@ class TestScheduler(object):
                             else:
                                 if phase != SUBMIT_PHASE:
                                     # Somewhat subtle. Create_test considers submit/run to be the run phase,
-                                    # so don't try to update test status for a passed submit phase
-                                    self._update_test_status(test, phase, TEST_PEND_STATUS)
-                                    self._update_test_status(test, phase, status)
+                                    # so don't try to update test status for a passed submit phase.
+                                    # TestStatus already records the phases in order, so there is no
+                                    # need to step through PEND for each one.
+                                    self._set_test_data(test, phase, status)
 
                                     if phase == RUN_PHASE:
                                         logger.info("Test {} passed and will not be re-run".format(test))
 
                 logger.info("Using existing test directory {}".format(self._get_test_dir(test)))
         else:
-            # None of the test directories should already exist.
+            # None of the test directories should already exist. Read test_root
+            # once rather than checking every test directory separately.
+            try:
+                test_root_entries = set(os.listdir(self._test_root))
+            except OSError:
+                test_root_entries = set()
+
             for test in self._tests:
-                expect(not os.path.exists(self._get_test_dir(test)),
+                expect(self._get_case_id(test) not in test_root_entries,
                        "Cannot create new case in directory '{}', it already exists."
                        " Pick a different test-id".format(self._get_test_dir(test)))
                 logger.info("Creating test directory {}".format(self._get_test_dir(test)))
 
         # Setup build groups
         if single_exe:
-            self._build_groups = [self._tests]
+            self._build_groups = [tuple(self._tests)]
         elif self._cime_model == "e3sm":
             # Any test that's in a shared-enabled suite with other tests should share exes
             self._build_groups = get_build_groups(self._tests)
@@ -309,13 +405,17 @@ class TestScheduler(object):
 
         # Build group to exeroot map
         self._build_group_exeroots = {}
+        # test -> (is first test of its build group, first test, build group)
+        self._test_build_groups = {}
         for build_group in self._build_groups:
             self._build_group_exeroots[build_group] = None
+            for test_name in build_group:
+                self._test_build_groups[test_name] = (test_name == build_group[0], build_group[0], build_group)
 
         logger.debug("Build groups are:")
         for build_group in self._build_groups:
             for test_name in build_group:
-                logger.debug("{}{}".format("  " if test_name == build_group[0] else "    ", test_name))
+                logger.debug("%s%s", "  " if test_name == build_group[0] else "    ", test_name)
 
         self._chksum = chksum
         # By the end of this constructor, this program should never hard abort,
@@ -340,20 +440,30 @@ class TestScheduler(object):
     ###########################################################################
     def _get_case_id(self, test):
     ###########################################################################
-        baseline_action_code = ""
-        if self._baseline_gen_name:
-            baseline_action_code += "G"
-        if self._baseline_cmp_name:
-            baseline_action_code += "C"
-        if len(baseline_action_code) > 0:
-            return "{}.{}.{}".format(test, baseline_action_code, self._test_id)
-        else:
-            return "{}.{}".format(test, self._test_id)
+        return self._case_ids[test]
 
     ###########################################################################
     def _get_test_dir(self, test):
     ###########################################################################
-        return os.path.join(self._test_root, self._get_case_id(test))
+        return self._test_dirs[test]
+
+    ###########################################################################
+    def _find_teststatus_files(self):
+    ###########################################################################
+        """
+        Return the TestStatus files of all test dirs in the test root with
+        this test id, i.e. what glob would return for *<test_id>/TestStatus
+        """
+        teststatus_files = []
+        with os.scandir(self._test_root) as entries:
+            for entry in entries:
+                if entry.name.endswith(self._test_id) and not entry.name.startswith(".") \
+                   and entry.is_dir():
+                    teststatus_file = os.path.join(entry.path, TEST_STATUS_FILENAME)
+                    if os.path.isfile(teststatus_file):
+                        teststatus_files.append(teststatus_file)
+
+        return teststatus_files
 
     ###########################################################################
     def _get_test_data(self, test):
@@ -361,6 +471,23 @@ class TestScheduler(object):
         # Must be atomic
         return self._tests[test]
 
+    ###########################################################################
+    def _set_test_data(self, test, phase, status):
+    ###########################################################################
+        """
+        Set the state of a test without the transition checks done by
+        _update_test_status. Only for restoring states that are already known
+        to be consistent, like those read back from an existing TestStatus.
+        """
+        expect(phase in self._phase_idx, "Phase '{}' is not run for test '{}'".format(phase, test))
+        # Must be atomic
+        self._tests[test] = (phase, status)
+
+    ###########################################################################
+    def _get_test_options(self, test):
+    ###########################################################################
+        return self._test_options.get(test, {})
+
     ###########################################################################
     def _is_broken(self, test):
     ###########################################################################
@@ -382,7 +509,7 @@ class TestScheduler(object):
             return curr_status
         else:
             # Assume all future phases are PEND
-            if phase is not None and self._phases.index(phase) > self._phases.index(curr_phase):
+            if phase is not None and self._phase_idx[phase] > self._phase_idx[curr_phase]:
                 return TEST_PEND_STATUS
 
             # Assume all older phases PASSed
@@ -396,7 +523,7 @@ class TestScheduler(object):
     ###########################################################################
     def _update_test_status(self, test, phase, status):
     ###########################################################################
-        phase_idx = self._phases.index(phase)
+        phase_idx = self._phase_idx[phase]
         old_phase, old_status = self._get_test_data(test)
 
         if old_phase == phase:
@@ -409,7 +536,7 @@ class TestScheduler(object):
                    "Why did we move on to next phase when prior phase did not pass?")
             expect(status == TEST_PEND_STATUS,
                    "New phase should be set to pending status")
-            expect(self._phases.index(old_phase) == phase_idx - 1,
+            expect(self._phase_idx[old_phase] == phase_idx - 1,
                    "Skipped phase? {} {}".format(old_phase, phase_idx))
 
         # Must be atomic
@@ -418,6 +545,7 @@ class TestScheduler(object):
     ###########################################################################
     def _shell_cmd_for_phase(self, test, cmd, phase, from_dir=None):
     ###########################################################################
+        retry_delays = iter(_BAD_INTERPRETER_RETRY_DELAYS)
         while True:
             rc, output, errput = run_cmd(cmd, from_dir=from_dir)
             if rc != 0:
@@ -428,10 +556,13 @@ class TestScheduler(object):
                 # Temporary hack to get around odd file descriptor use by
                 # buildnml scripts.
                 if "bad interpreter" in output:
-                    time.sleep(1)
-                    continue
-                else:
-                    return False, errput
+                    delay = next(retry_delays, None)
+                    if delay is not None:
+                        logger.warning("{} for test '{}' hit 'bad interpreter', retrying in {} seconds".format(phase, test, delay))
+                        time.sleep(delay)
+                        continue
+
+                return False, errput
             else:
                 # We don't want "RUN PASSED" in the TestStatus.log if the only thing that
                 # succeeded was the submission.
@@ -442,67 +573,103 @@ class TestScheduler(object):
                                         output + "\n" + errput))
                 return True, errput
 
+    ###########################################################################
+    def _get_config_tests(self):
+    ###########################################################################
+        if self._config_tests is None:
+            self._config_tests = Tests()
+
+        return self._config_tests
+
+    ###########################################################################
+    def _find_test_mod_file(self, component, modspath):
+    ###########################################################################
+        """
+        Return (test_mod_file, None) for the testmod directory of component and
+        modspath, or (None, error) if it cannot be found. Many tests share the same
+        testmods, so results are cached per driver.
+        """
+        key = (self._cime_driver, component, modspath)
+        if key not in self._test_mod_files:
+            # Files.get_value changes the object's state, so use a fresh one
+            files = Files(comp_interface=self._cime_driver)
+            testmods_dir = files.get_value("TESTS_MODS_DIR", {"component": component})
+            test_mod_file = os.path.join(testmods_dir, component, modspath)
+            result = (test_mod_file, None)
+            # if no testmod is found check if a usermod of the same name exists and
+            # use it if it does.
+            if not os.path.exists(test_mod_file):
+                usermods_dir = files.get_value("USER_MODS_DIR", {"component": component})
+                test_mod_file = os.path.join(usermods_dir, modspath)
+                if os.path.exists(test_mod_file):
+                    result = (test_mod_file, None)
+                else:
+                    result = (None, "Missing testmod file '{}', checked {} and {}".format(modspath, testmods_dir, usermods_dir))
+
+            self._test_mod_files[key] = result
+
+        return self._test_mod_files[key]
+
     ###########################################################################
     def _create_newcase_phase(self, test):
     ###########################################################################
         test_dir = self._get_test_dir(test)
 
-        _, case_opts, grid, compset,\
-            machine, compiler, test_mods = parse_test_name(test)
+        test_case, case_opts, grid, compset,\
+            machine, compiler, test_mods = _parse_test_name(test)
 
         os.environ["FROM_CREATE_TEST"] = "True"
-        create_newcase_cmd = "{} --case {} --res {} --compset {}"\
-                             " --test".format(os.path.join(self._cime_root, "scripts", "create_newcase"),
-                                              test_dir, grid, compset)
+        create_newcase_args = [os.path.join(self._cime_root, "scripts", "create_newcase"),
+                               "--case", test_dir, "--res", grid, "--compset", compset, "--test"]
         if machine is not None:
-            create_newcase_cmd += " --machine {}".format(machine)
+            create_newcase_args.extend(("--machine", machine))
         if compiler is not None:
-            create_newcase_cmd += " --compiler {}".format(compiler)
+            create_newcase_args.extend(("--compiler", compiler))
         if self._project is not None:
-            create_newcase_cmd += " --project {} ".format(self._project)
+            create_newcase_args.extend(("--project", self._project))
         if self._output_root is not None:
-            create_newcase_cmd += " --output-root {} ".format(self._output_root)
+            create_newcase_args.extend(("--output-root", self._output_root))
         if self._input_dir is not None:
-            create_newcase_cmd += " --input-dir {} ".format(self._input_dir)
+            create_newcase_args.extend(("--input-dir", self._input_dir))
         if self._non_local:
-            create_newcase_cmd += " --non-local"
+            create_newcase_args.append("--non-local")
         if self._workflow:
-            create_newcase_cmd += " --workflow {}".format(self._workflow)
+            create_newcase_args.extend(("--workflow", self._workflow))
 
         if self._pesfile is not None:
-            create_newcase_cmd += " --pesfile {} ".format(self._pesfile)
+            create_newcase_args.extend(("--pesfile", self._pesfile))
 
         mpilib = None
         ninst = 1
         ncpl = 1
         if case_opts is not None:
             for case_opt in case_opts: # pylint: disable=not-an-iterable
-                if case_opt.startswith('M'):
-                    mpilib = case_opt[1:]
-                    create_newcase_cmd += " --mpilib {}".format(mpilib)
-                    logger.debug (" MPILIB set to {}".format(mpilib))
-                elif case_opt.startswith('N'):
+                # All options handled here are a single letter followed by a value
+                opt_type, opt_value = case_opt[:1], case_opt[1:]
+                if opt_type == 'M':
+                    mpilib = opt_value
+                    create_newcase_args.extend(("--mpilib", mpilib))
+                    logger.debug(" MPILIB set to %s", mpilib)
+                elif opt_type == 'N':
                     expect(ncpl == 1,"Cannot combine _C and _N options")
-                    ninst = case_opt[1:]
-                    create_newcase_cmd += " --ninst {}".format(ninst)
-                    logger.debug (" NINST set to {}".format(ninst))
-                elif case_opt.startswith('C'):
+                    ninst = opt_value
+                    create_newcase_args.extend(("--ninst", ninst))
+                    logger.debug(" NINST set to %s", ninst)
+                elif opt_type == 'C':
                     expect(ninst == 1,"Cannot combine _C and _N options")
-                    ncpl = case_opt[1:]
-                    create_newcase_cmd += " --ninst {} --multi-driver" .format(ncpl)
-                    logger.debug (" NCPL set to {}" .format(ncpl))
-                elif case_opt.startswith('P'):
-                    pesize = case_opt[1:]
-                    create_newcase_cmd += " --pecount {}".format(pesize)
-                elif case_opt.startswith('G'):
-                    ngpus_per_node = case_opt[1:]
-                    create_newcase_cmd += " --ngpus-per-node {}".format(ngpus_per_node)
-                elif case_opt.startswith('V'):
-                    self._cime_driver = case_opt[1:]
-                    create_newcase_cmd += " --driver {}".format(self._cime_driver)
+                    ncpl = opt_value
+                    create_newcase_args.extend(("--ninst", ncpl, "--multi-driver"))
+                    logger.debug(" NCPL set to %s", ncpl)
+                elif opt_type == 'P':
+                    create_newcase_args.extend(("--pecount", opt_value))
+                elif opt_type == 'G':
+                    create_newcase_args.extend(("--ngpus-per-node", opt_value))
+                elif opt_type == 'V':
+                    self._cime_driver = opt_value
+                    create_newcase_args.extend(("--driver", self._cime_driver))
 
         if test_mods is not None:
-            create_newcase_cmd += " --user-mods-dir "
+            create_newcase_args.append("--user-mods-dir")
 
             for one_test_mod in test_mods: # pylint: disable=not-an-iterable
                 if one_test_mod.find('/') != -1:
@@ -512,62 +679,53 @@ class TestScheduler(object):
                     self._log_output(test, error)
                     return False, error
 
-                files = Files(comp_interface=self._cime_driver)
-                testmods_dir = files.get_value("TESTS_MODS_DIR", {"component": component})
-                test_mod_file = os.path.join(testmods_dir, component, modspath)
-                # if no testmod is found check if a usermod of the same name exists and
-                # use it if it does.
-                if not os.path.exists(test_mod_file):
-                    usermods_dir = files.get_value("USER_MODS_DIR", {"component": component})
-                    test_mod_file = os.path.join(usermods_dir, modspath)
-                    if not os.path.exists(test_mod_file):
-                        error = "Missing testmod file '{}', checked {} and {}".format(modspath, testmods_dir, usermods_dir)
-                        self._log_output(test, error)
-                        return False, error
-
-                create_newcase_cmd += "{} ".format(test_mod_file)
+                test_mod_file, error = self._find_test_mod_file(component, modspath)
+                if test_mod_file is None:
+                    self._log_output(test, error)
+                    return False, error
+
+                create_newcase_args.append(test_mod_file)
 
         # create_test mpilib option overrides default but not explicitly set case_opt mpilib
         if mpilib is None and self._mpilib is not None:
-            create_newcase_cmd += " --mpilib {}".format(self._mpilib)
-            logger.debug (" MPILIB set to {}".format(self._mpilib))
+            create_newcase_args.extend(("--mpilib", self._mpilib))
+            logger.debug(" MPILIB set to %s", self._mpilib)
 
         if self._queue is not None:
-            create_newcase_cmd += " --queue={}".format(self._queue)
+            create_newcase_args.append("--queue={}".format(self._queue))
         else:
             # We need to hard code the queue for this test on cheyenne
             # otherwise it runs in share and fails intermittently
-            test_case = parse_test_name(test)[0]
             if test_case == "NODEFAIL":
                 machine = machine if machine is not None else self._machobj.get_machine_name()
                 if machine == "cheyenne":
-                    create_newcase_cmd += " --queue=regular"
+                    create_newcase_args.append("--queue=regular")
 
+        test_options = self._get_test_options(test)
         if self._walltime is not None:
-            create_newcase_cmd += " --walltime {}".format(self._walltime)
+            create_newcase_args.extend(("--walltime", self._walltime))
         else:
             # model specific ways of setting time
             if self._cime_model == "e3sm":
                 recommended_time = _get_time_est(test, self._baseline_root)
 
                 if recommended_time is not None:
-                    create_newcase_cmd += " --walltime {}".format(recommended_time)
+                    create_newcase_args.extend(("--walltime", recommended_time))
 
             else:
-                if test in self._test_data and "options" in self._test_data[test] and \
-                        "wallclock" in self._test_data[test]['options']:
-                    create_newcase_cmd += " --walltime {}".format(self._test_data[test]['options']['wallclock'])
-        if test in self._test_data and "options" in self._test_data[test] and \
-                        "workflow" in self._test_data[test]['options']:
-            create_newcase_cmd += " --workflow {}".format(self._test_data[test]['options']['workflow'])
-
-        logger.debug("Calling create_newcase: " + create_newcase_cmd)
+                if "wallclock" in test_options:
+                    create_newcase_args.extend(("--walltime", test_options['wallclock']))
+        if "workflow" in test_options:
+            create_newcase_args.extend(("--workflow", test_options['workflow']))
+
+        create_newcase_cmd = " ".join(str(arg) for arg in create_newcase_args)
+        logger.debug("Calling create_newcase: %s", create_newcase_cmd)
         return self._shell_cmd_for_phase(test, create_newcase_cmd, CREATE_NEWCASE_PHASE)
 
     ###########################################################################
     def _xml_phase(self, test):
     ###########################################################################
-        test_case,case_opts,_,_,_,compiler,_ = parse_test_name(test)
+        test_case,case_opts,_,_,_,compiler,_ = _parse_test_name(test)
 
         # Create, fill and write an envtest object
         test_dir = self._get_test_dir(test)
@@ -594,15 +752,15 @@ class TestScheduler(object):
         envtest.set_value("TESTCASE", test_case)
         envtest.set_value("TEST_TESTID", self._test_id)
         envtest.set_value("CASEBASEID", test)
-        if test in self._test_data and "options" in self._test_data[test] and \
-                "memleak_tolerance" in self._test_data[test]['options']:
-            envtest.set_value("TEST_MEMLEAK_TOLERANCE", self._test_data[test]['options']['memleak_tolerance'])
+        test_options = self._get_test_options(test)
+        if "memleak_tolerance" in test_options:
+            envtest.set_value("TEST_MEMLEAK_TOLERANCE", test_options['memleak_tolerance'])
 
         test_argv = "-testname {} -testroot {}".format(test, self._test_root)
         if self._baseline_gen_name:
             test_argv += " -generate {}".format(self._baseline_gen_name)
-            basegen_case_fullpath = os.path.join(self._baseline_root,self._baseline_gen_name, test)
-            logger.debug("basegen_case is {}".format(basegen_case_fullpath))
+            basegen_case_fullpath = os.path.join(self._baseline_gen_dir, test)
+            logger.debug("basegen_case is %s", basegen_case_fullpath)
             envtest.set_value("BASELINE_NAME_GEN", self._baseline_gen_name)
             envtest.set_value("BASEGEN_CASE", os.path.join(self._baseline_gen_name, test))
         if self._baseline_cmp_name:
@@ -616,17 +774,18 @@ class TestScheduler(object):
         envtest.set_value("BASELINE_ROOT", self._baseline_root)
         envtest.set_value("GENERATE_BASELINE", self._baseline_gen_name is not None)
         envtest.set_value("COMPARE_BASELINE", self._baseline_cmp_name is not None)
-        envtest.set_value("CCSM_CPRNC", self._machobj.get_value("CCSM_CPRNC", resolved=False))
-        tput_tolerance = self._machobj.get_value("TEST_TPUT_TOLERANCE", resolved=False)
-        if test in self._test_data and "options" in self._test_data[test] and \
-           "tput_tolerance" in self._test_data[test]['options']:
-            tput_tolerance = self._test_data[test]['options']['tput_tolerance']
+        envtest.set_value("CCSM_CPRNC", self._ccsm_cprnc)
+        tput_tolerance = self._tput_tolerance
+        if "tput_tolerance" in test_options:
+            tput_tolerance = test_options['tput_tolerance']
 
         envtest.set_value("TEST_TPUT_TOLERANCE", 0.25 if tput_tolerance is None else tput_tolerance)
 
         # Add the test instructions from config_test to env_test in the case
-        config_test = Tests()
-        testnode = config_test.get_test_node(test_case)
+        # config_tests.xml is shared by all tests, so copy the test node before
+        # set_test_parameter below modifies it
+        config_test = self._get_config_tests()
+        testnode = config_test.copy(config_test.get_test_node(test_case))
         envtest.add_test(testnode)
 
         if compiler == 'nag':
@@ -634,66 +793,50 @@ class TestScheduler(object):
 
         # Determine case_opts from the test_case
         if case_opts is not None:
-            logger.debug("case_opts are {} ".format(case_opts))
+            logger.debug("case_opts are %s ", case_opts)
             for opt in case_opts: # pylint: disable=not-an-iterable
 
-                logger.debug("case_opt is {}".format(opt))
-                if opt == 'D':
-                    envtest.set_test_parameter("DEBUG", "TRUE")
-                    logger.debug (" DEBUG set to TRUE")
+                logger.debug("case_opt is %s", opt)
+                opt_type = opt[:1]
+                if opt in _XML_PHASE_FLAG_CASEOPTS:
+                    name, value = _XML_PHASE_FLAG_CASEOPTS[opt]
+                    envtest.set_test_parameter(name, value)
+                    logger.debug(" %s set to %s", name, value)
 
-                elif opt == 'E':
-                    envtest.set_test_parameter("USE_ESMF_LIB", "TRUE")
-                    logger.debug (" USE_ESMF_LIB set to TRUE")
-
-                elif opt == 'CG':
-                    envtest.set_test_parameter("CALENDAR", "GREGORIAN")
-                    logger.debug (" CALENDAR set to {}".format(opt))
-
-                elif opt.startswith('L'):
-                    match =  re.match('L([A-Za-z])([0-9]*)', opt)
-                    stop_option = {"y":"nyears", "m":"nmonths", "d":"ndays", "h":"nhours",
-                                   "s":"nseconds", "n":"nsteps"}
+                elif opt_type == 'L':
+                    match = _STOP_CASEOPT_RE.match(opt)
                     opt = match.group(1)
-                    envtest.set_test_parameter("STOP_OPTION",stop_option[opt])
+                    envtest.set_test_parameter("STOP_OPTION",_STOP_OPTIONS[opt])
                     opti = match.group(2)
                     envtest.set_test_parameter("STOP_N", opti)
 
-                    logger.debug (" STOP_OPTION set to {}".format(stop_option[opt]))
-                    logger.debug (" STOP_N      set to {}".format(opti))
+                    logger.debug(" STOP_OPTION set to %s", _STOP_OPTIONS[opt])
+                    logger.debug(" STOP_N      set to %s", opti)
 
-                elif opt.startswith('R'):
+                elif opt_type == 'R':
                     # R option is for testing in PTS_MODE or Single Column Model
                     #  (SCM) mode
                     envtest.set_test_parameter("PTS_MODE", "TRUE")
 
                     # For PTS_MODE, set all tasks and threads to 1
-                    comps=["ATM","LND","ICE","OCN","CPL","GLC","ROF","WAV"]
+                    for ntasks, nthrds, rootpe in _PTS_MODE_PES_PARAMS:
+                        envtest.set_test_parameter(ntasks, "1")
+                        envtest.set_test_parameter(nthrds, "1")
+                        envtest.set_test_parameter(rootpe, "0")
 
-                    for comp in comps:
-                        envtest.set_test_parameter("NTASKS_"+comp, "1")
-                        envtest.set_test_parameter("NTHRDS_"+comp, "1")
-                        envtest.set_test_parameter("ROOTPE_"+comp, "0")
-                        envtest.set_test_parameter("PIO_TYPENAME", "netcdf")
+                    envtest.set_test_parameter("PIO_TYPENAME", "netcdf")
 
-                elif opt.startswith('A'):
+                elif opt_type == 'A':
                     # A option is for testing in ASYNC IO mode, only available with nuopc driver and pio2
                     envtest.set_test_parameter("PIO_ASYNC_INTERFACE", "TRUE")
                     envtest.set_test_parameter("CIME_DRIVER", "nuopc")
                     envtest.set_test_parameter("PIO_VERSION", "2")
-                    match =  re.match('A([0-9]+)x?([0-9])*', opt)
+                    match = _ASYNC_IO_CASEOPT_RE.match(opt)
                     envtest.set_test_parameter("PIO_NUMTASKS_CPL",  match.group(1))
                     if match.group(2):
                         envtest.set_test_parameter("PIO_STRIDE_CPL",match.group(2))
 
-                elif (opt.startswith('I') or # Marker to distinguish tests with same name - ignored
-                      opt.startswith('M') or # handled in create_newcase
-                      opt.startswith('P') or # handled in create_newcase
-                      opt.startswith('N') or # handled in create_newcase
-                      opt.startswith('C') or # handled in create_newcase
-                      opt.startswith('V') or # handled in create_newcase
-                      opt.startswith('G') or # handled in create_newcase
-                      opt == 'B'):           # handled in run_phase
+                elif opt_type in _XML_PHASE_IGNORED_CASEOPTS or opt == 'B': # B is handled in run_phase
                     pass
 
                 elif opt.startswith('IOP'):
@@ -763,11 +906,8 @@ class TestScheduler(object):
     ###########################################################################
     def _get_build_group(self, test):
     ###########################################################################
-        for build_group in self._build_groups:
-            if test in build_group:
-                return test == build_group[0], build_group[0], build_group
-
-        expect(False, "No build group for test '{}'".format(test))
+        expect(test in self._test_build_groups, "No build group for test '{}'".format(test))
+        return self._test_build_groups[test]
 
     ###########################################################################
     def _model_build_phase(self, test):
@@ -792,7 +932,7 @@ class TestScheduler(object):
     ###########################################################################
         test_dir = self._get_test_dir(test)
 
-        case_opts = parse_test_name(test)[1]
+        case_opts = _parse_test_name(test)[1]
         if case_opts is not None and "B" in case_opts: # pylint: disable=unsupported-membership-test
             self._log_output(test, "{} SKIPPED for test '{}'".format(RUN_PHASE, test))
             self._update_test_status_file(test, SUBMIT_PHASE, TEST_PASS_STATUS)
@@ -834,17 +974,20 @@ class TestScheduler(object):
         is_first_test, first_test, _ = self._get_build_group(test)
 
         if not is_first_test:
-            build_group_dep_phases = [XML_PHASE, SHAREDLIB_BUILD_PHASE, MODEL_BUILD_PHASE]
-            if phase in build_group_dep_phases:
+            if phase in _BUILD_GROUP_DEP_PHASES:
                 if self._get_test_status(first_test, phase=phase) == TEST_PEND_STATUS:
                     return self._proc_pool + 1
                 else:
                     return 1
 
         if phase == RUN_PHASE and (self._no_batch or no_batch):
-            test_dir = self._get_test_dir(test)
-            total_pes = EnvMachPes(test_dir, read_only=True).get_value("TOTALPES")
-            return total_pes
+            # The producer asks again every time it looks for work, but the
+            # pes layout is fixed by the time the run phase is next
+            if test not in self._total_pes:
+                test_dir = self._get_test_dir(test)
+                self._total_pes[test] = EnvMachPes(test_dir, read_only=True).get_value("TOTALPES")
+
+            return self._total_pes[test]
 
         elif (phase == SHAREDLIB_BUILD_PHASE):
             if self._cime_model != "e3sm":
@@ -866,18 +1009,20 @@ class TestScheduler(object):
     def _wait_for_something_to_finish(self, threads_in_flight):
     ###########################################################################
         expect(len(threads_in_flight) <= self._parallel_jobs, "Oversubscribed?")
-        finished_tests = []
-        while not finished_tests:
-            for test, thread_info in threads_in_flight.items():
-                if not thread_info[0].is_alive():
-                    finished_tests.append((test, thread_info[1]))
-
-            if not finished_tests:
-                time.sleep(0.2)
+        # Block until at least one test finishes, then also reap any others that
+        # finished in the meantime
+        finished_tests = [self._finished_tests.get()]
+        while True:
+            try:
+                finished_tests.append(self._finished_tests.get_nowait())
+            except Empty:
+                break
 
-        for finished_test, procs_needed in finished_tests:
+        for finished_test in finished_tests:
+            finished_thread, procs_needed, _ = threads_in_flight.pop(finished_test)
+            # The thread is just returning from _run_consumer
+            finished_thread.join()
             self._procs_avail += procs_needed
-            del threads_in_flight[finished_test]
 
     ###########################################################################
     def _update_test_status_file(self, test, test_phase, status):
@@ -893,9 +1038,9 @@ class TestScheduler(object):
     ###########################################################################
     def _consumer(self, test, test_phase, phase_method):
     ###########################################################################
-        before_time = time.time()
+        before_time = time.perf_counter()
         success, errors = self._run_catch_exceptions(test, test_phase, phase_method)
-        elapsed_time = time.time() - before_time
+        elapsed_time = time.perf_counter() - before_time
         status  = (TEST_PEND_STATUS if test_phase == RUN_PHASE and not \
                    self._no_batch else TEST_PASS_STATUS) if success else TEST_FAIL_STATUS
 
@@ -933,65 +1078,79 @@ class TestScheduler(object):
             self._update_test_status(test, RUN_PHASE, TEST_PEND_STATUS)
             self._consumer(test, RUN_PHASE, self._run_phase)
 
+    ###########################################################################
+    def _run_consumer(self, test, test_phase, phase_method):
+    ###########################################################################
+        """
+        Thread target for a phase. Always tells the producer when the thread
+        is done, even if the consumer fails.
+        """
+        try:
+            self._consumer(test, test_phase, phase_method)
+        finally:
+            self._finished_tests.put(test)
+
     ###########################################################################
     def _producer(self):
     ###########################################################################
         threads_in_flight = {} # test-name -> (thread, procs, phase)
+        # Tests that may still have work, in scheduling order. Once a test is done
+        # it stays done, so finished tests are dropped instead of rescanned.
+        tests_with_work = list(self._tests)
         while True:
-            work_to_do = False
-            num_threads_launched_this_iteration = 0
-            for test in self._tests:
-                logger.debug("test_name: " + test)
+            tests_with_work = [test for test in tests_with_work if self._work_remains(test)]
+            if not tests_with_work:
+                break
 
-                if self._work_remains(test):
-                    work_to_do = True
+            num_threads_launched_this_iteration = 0
+            for test in tests_with_work:
+                logger.debug("test_name: %s", test)
 
-                    # If we have no workers available, immediately break out of loop so we can wait
-                    if len(threads_in_flight) == self._parallel_jobs:
-                        break
+                # If we have no workers available, immediately break out of loop so we can wait
+                if len(threads_in_flight) == self._parallel_jobs:
+                    break
 
-                    if test not in threads_in_flight:
-                        test_phase, test_status = self._get_test_data(test)
-                        expect(test_status != TEST_PEND_STATUS, test)
-                        next_phase = self._phases[self._phases.index(test_phase) + 1]
-                        procs_needed = self._get_procs_needed(test, next_phase, threads_in_flight)
+                # The test may have finished since the list was filtered
+                if test not in threads_in_flight and self._work_remains(test):
+                    test_phase, test_status = self._get_test_data(test)
+                    expect(test_status != TEST_PEND_STATUS, test)
+                    next_phase = self._phases[self._phase_idx[test_phase] + 1]
+                    procs_needed = self._get_procs_needed(test, next_phase, threads_in_flight)
 
-                        if procs_needed <= self._procs_avail:
-                            self._procs_avail -= procs_needed
+                    if procs_needed <= self._procs_avail:
+                        self._procs_avail -= procs_needed
 
-                            # Necessary to print this way when multiple threads printing
-                            logger.info("Starting {} for test {} with {:d} procs".format(next_phase, test, procs_needed))
+                        # Necessary to print this way when multiple threads printing
+                        logger.info("Starting {} for test {} with {:d} procs".format(next_phase, test, procs_needed))
 
-                            self._update_test_status(test, next_phase, TEST_PEND_STATUS)
-                            new_thread = threading.Thread(target=self._consumer,
-                                args=(test, next_phase, getattr(self, "_{}_phase".format(next_phase.lower())) ))
-                            threads_in_flight[test] = (new_thread, procs_needed, next_phase)
-                            new_thread.start()
-                            num_threads_launched_this_iteration += 1
+                        self._update_test_status(test, next_phase, TEST_PEND_STATUS)
+                        new_thread = threading.Thread(target=self._run_consumer,
+                            args=(test, next_phase, getattr(self, "_{}_phase".format(next_phase.lower())) ))
+                        threads_in_flight[test] = (new_thread, procs_needed, next_phase)
+                        new_thread.start()
+                        num_threads_launched_this_iteration += 1
 
+                        if logger.isEnabledFor(logging.DEBUG):
                             logger.debug("  Current workload:")
                             total_procs = 0
                             for the_test, the_data in six.iteritems(threads_in_flight):
-                                logger.debug("    {}: {} -> {}".format(the_test, the_data[2], the_data[1]))
+                                logger.debug("    %s: %s -> %s", the_test, the_data[2], the_data[1])
                                 total_procs += the_data[1]
 
-                            logger.debug("    Total procs in use: {}".format(total_procs))
-                        else:
-                            if not threads_in_flight:
-                                msg = "Phase '{}' for test '{}' required more processors, {:d}, than this machine can provide, {:d}".format(next_phase, test, procs_needed, self._procs_avail)
-                                logger.warning(msg)
-                                self._update_test_status(test, next_phase, TEST_PEND_STATUS)
-                                self._update_test_status(test, next_phase, TEST_FAIL_STATUS)
-                                self._log_output(test, msg)
-                                if next_phase == RUN_PHASE:
-                                    self._update_test_status_file(test, SUBMIT_PHASE, TEST_PASS_STATUS)
-                                    self._update_test_status_file(test, next_phase, TEST_FAIL_STATUS)
-                                else:
-                                    self._update_test_status_file(test, next_phase, TEST_FAIL_STATUS)
-                                num_threads_launched_this_iteration += 1
-
-            if not work_to_do:
-                break
+                            logger.debug("    Total procs in use: %s", total_procs)
+                    else:
+                        if not threads_in_flight:
+                            msg = "Phase '{}' for test '{}' required more processors, {:d}, than this machine can provide, {:d}".format(next_phase, test, procs_needed, self._procs_avail)
+                            logger.warning(msg)
+                            self._update_test_status(test, next_phase, TEST_PEND_STATUS)
+                            self._update_test_status(test, next_phase, TEST_FAIL_STATUS)
+                            self._log_output(test, msg)
+                            if next_phase == RUN_PHASE:
+                                self._update_test_status_file(test, SUBMIT_PHASE, TEST_PASS_STATUS)
+                                self._update_test_status_file(test, next_phase, TEST_FAIL_STATUS)
+                            else:
+                                self._update_test_status_file(test, next_phase, TEST_FAIL_STATUS)
+                            num_threads_launched_this_iteration += 1
 
             if num_threads_launched_this_iteration == 0:
                 # No free resources, wait for something in flight to finish
@@ -1052,12 +1211,11 @@ class TestScheduler(object):
 
         Return True if all tests passed.
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         # Tell user what will be run
-        logger.info( "RUNNING TESTS:")
-        for test in self._tests:
-            logger.info( "  {}".format(test))
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("RUNNING TESTS:\n%s", "\n".join("  " + test for test in self._tests))
 
         # Setup cs files
         self._setup_cs_files()
@@ -1066,14 +1224,18 @@ class TestScheduler(object):
         self._producer()
         GenericXML.DISABLE_CACHING = False
 
-        expect(threading.active_count() == 1, "Leftover threads?")
+        if threading.active_count() > 1:
+            expect(False, "Leftover threads? {}".format(
+                ", ".join(thread.name for thread in threading.enumerate()
+                          if thread is not threading.current_thread())))
 
         # Copy TestStatus files to baselines for tests that have already failed.
-        if get_model() == "cesm":
-            for test in self._tests:
-                status = self._get_test_data(test)[1]
-                if status not in [TEST_PASS_STATUS, TEST_PEND_STATUS] and self._baseline_gen_name:
-                    basegen_case_fullpath = os.path.join(self._baseline_root,self._baseline_gen_name, test)
+        if get_model() == "cesm" and self._baseline_gen_name:
+            # All consumer threads have been joined, so read the states directly
+            basegen_prefix = self._baseline_gen_dir + os.sep
+            for test, (_, status) in self._tests.items():
+                if status not in _SKIP_BASELINE_STATUSES:
+                    basegen_case_fullpath = basegen_prefix + test
                     test_dir = self._get_test_dir(test)
                     generate_teststatus(test_dir, basegen_case_fullpath)
 
@@ -1084,7 +1246,7 @@ class TestScheduler(object):
         expect_test_complete = not self._no_run and (self._no_batch or wait)
 
         logger.info("Waiting for tests to finish")
-        rv = wait_for_tests(glob.glob(os.path.join(self._test_root, "*{}/TestStatus".format(self._test_id))),
+        rv = wait_for_tests(self._find_teststatus_files(),
                             no_wait=not wait,
                             check_throughput=check_throughput,
                             check_memory=check_memory,
@@ -1097,6 +1259,6 @@ class TestScheduler(object):
             logger.info("Due to presence of batch system, create_test will exit before tests are complete.\n" \
                         "To force create_test to wait for full completion, use --wait")
 
-        logger.info( "test-scheduler took {} seconds".format(time.time() - start_time))
+        logger.info("test-scheduler took %.2f seconds", time.perf_counter() - start_time)
 
         return rv
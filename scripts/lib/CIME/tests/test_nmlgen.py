@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+"""
+This module tests *some* functionality of CIME.nmlgen
+"""
+
+# Ignore privacy concerns for unit tests, so that unit tests can access
+# protected members of the system under test
+#
+# pylint:disable=protected-access
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from CIME.nmlgen import NamelistGenerator
+
+class TestNamelistGenerator(unittest.TestCase):
+    """Tests some functionality of CIME.nmlgen.NamelistGenerator
+
+    The generator is built without calling __init__, so only methods that do
+    not need a case or a namelist definition are covered here.
+    """
+
+    def setUp(self):
+        self.nmlgen = NamelistGenerator.__new__(NamelistGenerator)
+
+    def test_get_input_file_lines(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        data_list_path = os.path.join(tempdir, "foo.input_data_list")
+        self.nmlgen._input_data_lines = {}
+
+        self.assertEqual(set(), self.nmlgen._get_input_file_lines(data_list_path))
+
+        with open(data_list_path, "w") as input_data_list:
+            input_data_list.write("a = /a.nc\n")
+        existing_lines = self.nmlgen._get_input_file_lines(data_list_path)
+        self.assertEqual({"a = /a.nc"}, existing_lines)
+        self.assertIs(existing_lines, self.nmlgen._get_input_file_lines(data_list_path))
+
+        with open(data_list_path, "a") as input_data_list:
+            input_data_list.write("b = /b.nc\n")
+        self.assertEqual({"a = /a.nc", "b = /b.nc"},
+                         self.nmlgen._get_input_file_lines(data_list_path))
+
+    def test_write_input_files(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        data_list_path = os.path.join(tempdir, "foo.input_data_list")
+        with open(data_list_path, "w") as input_data_list:
+            input_data_list.write("fsurdat = /data/old.nc\n")
+        self.nmlgen._input_data_lines = {}
+        self.nmlgen._namelist = mock.Mock()
+        self.nmlgen._namelist.get_group_names.return_value = ["foo_nml"]
+        self.nmlgen._namelist.get_variable_names.return_value = ["fsurdat", "nfiles"]
+        self.nmlgen._namelist.get_variable_value.return_value = [
+            "'/data/old.nc'", "'/data/new.nc'", "'/data/new.nc'"]
+        self.nmlgen._definition = mock.Mock()
+        self.nmlgen._definition.get_input_pathname.side_effect = \
+            lambda name: "abs" if name == "fsurdat" else None
+
+        self.nmlgen._write_input_files(data_list_path)
+
+        with open(data_list_path) as input_data_list:
+            self.assertEqual("fsurdat = /data/old.nc\nfsurdat = /data/new.nc\n",
+                             input_data_list.read())
+
+        # Nothing new to add, so the file is neither read nor written again
+        with mock.patch("builtins.open") as mock_open:
+            self.nmlgen._write_input_files(data_list_path)
+        mock_open.assert_not_called()
+
+    def test_validate_namelist_only_after_changes(self):
+        self.nmlgen._namelist = mock.Mock()
+        self.nmlgen._namelist_validated = False
+        self.nmlgen._definition = mock.Mock()
+        self.nmlgen._definition.split_type_string.return_value = ("integer", None, 1)
+
+        self.nmlgen.write_nuopc_config_file("foo.cfg")
+        self.nmlgen.write_nuopc_config_file("foo.cfg")
+        self.assertEqual(1, self.nmlgen._definition.validate.call_count)
+
+        self.nmlgen.set_value("bar", "1")
+        self.nmlgen.write_nuopc_config_file("foo.cfg")
+        self.assertEqual(2, self.nmlgen._definition.validate.call_count)
+
+    def test_convert_to_abs_file_path(self):
+        self.nmlgen._din_loc_root = "/din"
+        self.nmlgen._abs_path_cache = {}
+        self.nmlgen._file_exists_cache = {"/din/a.nc": True, "/b.nc": True}
+        self.assertEqual("/din/a.nc", self.nmlgen._convert_to_abs_file_path("a.nc", "foo"))
+        self.assertEqual("UNSET", self.nmlgen._convert_to_abs_file_path("UNSET", "foo"))
+        self.assertEqual("/din/a.nc:idmap:/b.nc",
+                         self.nmlgen._convert_to_abs_file_path("a.nc:idmap:/b.nc", "foo"))
+
+    def test_add_default_reencodes_abs_paths(self):
+        self.nmlgen._namelist = mock.Mock()
+        self.nmlgen._namelist.get_variable_value.return_value = ['"/a"b"', '"/c"  ']
+        self.nmlgen._definition = mock.Mock()
+        self.nmlgen._definition.get_value_match.return_value = None
+        self.nmlgen._definition.split_type_string.return_value = ("character", None, 2)
+        self.nmlgen._definition.get_input_pathname.return_value = "abs"
+        with mock.patch.object(self.nmlgen, "_convert_to_abs_file_path", side_effect=lambda path, _: path):
+            self.nmlgen.add_default("foo")
+        # Already absolute paths are still written as normalized literals
+        self.nmlgen._namelist.set_variable_value.assert_called_once_with(
+            self.nmlgen._definition.get_group.return_value, "foo", ['"/a""b"', '"/c"'], 2)
+
+    def test_write_output_file_groups(self):
+        self.nmlgen._namelist = mock.Mock()
+        self.nmlgen._namelist_validated = True
+        groups = ["foo_nml", "modelio", "seq_maps"]
+        self.nmlgen.write_output_file("foo_in", groups=groups)
+        self.nmlgen._namelist.write.assert_called_once_with("foo_in", groups=["foo_nml"],
+                                                            sorted_groups=True)
+        self.assertEqual(["foo_nml", "modelio", "seq_maps"], groups)
+
+    def test_add_file_to_input_data_list_rel(self):
+        new_lines = []
+        existing_lines = {"foo = /root/b.nc"}
+        with mock.patch.object(self.nmlgen, "get_value", return_value="/root") as get_value:
+            self.nmlgen._add_file_to_input_data_list(new_lines, "foo", "a.nc:b.nc:/abs/c.nc:UNSET:a.nc",
+                                                     "rel:rootdir", existing_lines)
+        get_value.assert_called_once_with("rootdir")
+        self.assertEqual(["foo = /root/a.nc\n", "foo = /abs/c.nc\n"], new_lines)
+
+    def test_quote_string(self):
+        self.assertEqual('"foo"', NamelistGenerator.quote_string("foo"))
+        self.assertEqual("'foo'", NamelistGenerator.quote_string("'foo'"))
+        self.assertEqual('"foo"', NamelistGenerator.quote_string('"foo"'))
+        self.assertEqual('"\'foo"', NamelistGenerator.quote_string("'foo"))
+        self.assertEqual('""', NamelistGenerator.quote_string(""))
+
+    def test_sub_paths_year(self):
+        result = self.nmlgen._sub_paths("foo.%y.nc", 2000, 2001)
+        self.assertEqual("foo.2000.nc\nfoo.2001.nc", result)
+
+    def test_sub_paths_year_month_digits(self):
+        result = self.nmlgen._sub_paths("foo.%2ym.nc", 1, 1).split("\n")
+        self.assertEqual(12, len(result))
+        self.assertEqual("foo.01-01.nc", result[0])
+        self.assertEqual("foo.01-12.nc", result[-1])
+
+    def test_sub_paths_year_month_day(self):
+        result = self.nmlgen._sub_paths("foo.%ymd.nc", 2000, 2000).split("\n")
+        self.assertEqual(365, len(result))
+        self.assertEqual("foo.2000-01-01.nc", result[0])
+        self.assertEqual("foo.2000-02-28.nc", result[58])
+        self.assertEqual("foo.2000-12-31.nc", result[-1])
+
+    def test_sub_paths_mixed_lines(self):
+        """Lines without a date indicator are passed through unchanged"""
+        result = self.nmlgen._sub_paths("static.nc\nfoo.%y.nc\n", 2000, 2001)
+        self.assertEqual("static.nc\nfoo.2000.nc\nfoo.2001.nc", result)
+
+    def test_sub_paths_repeated_indicator(self):
+        result = self.nmlgen._sub_paths("dir%y/foo.%y.nc", 2000, 2001)
+        self.assertEqual("dir2000/foo.2000.nc\ndir2001/foo.2001.nc", result)
+
+    def test_sub_fields_glc(self):
+        self.nmlgen._case = mock.Mock()
+        self.nmlgen._case.get_value.return_value = 2
+        result = self.nmlgen._sub_fields("foo\ntsrf%glc\nbar%glc\n")
+        self.assertEqual("foo\ntsrf00\ntsrf01\ntsrf02\nbar00\nbar01\nbar02", result)
+        self.nmlgen._case.get_value.assert_called_once_with("GLC_NEC")
+
+    def test_sub_fields_no_glc_classes(self):
+        self.nmlgen._case = mock.Mock()
+        self.nmlgen._case.get_value.return_value = 0
+        self.assertEqual("foo", self.nmlgen._sub_fields("foo\ntsrf%glc"))
+
+    def test_add_xml_delimiter(self):
+        items = [" a.nc", "b.nc "]
+        result = NamelistGenerator._add_xml_delimiter(items, "file")
+        self.assertEqual("<file>a.nc</file>\n      <file>b.nc</file>", result)
+        self.assertEqual([" a.nc", "b.nc "], items)
+
+    def test_to_namelist_literals_does_not_modify_input(self):
+        self.nmlgen._definition = mock.Mock()
+        self.nmlgen._definition.split_type_string.return_value = ("character", None, 3)
+        values = ["a", None, "'b'"]
+        result = self.nmlgen._to_namelist_literals("foo", values)
+        self.assertEqual(['"a"', "", "'b'"], result)
+        self.assertEqual(["a", None, "'b'"], values)
+
+    def _setup_get_default(self, default, var_type="character", xml_values=None):
+        self.nmlgen._definition = mock.Mock()
+        self.nmlgen._definition.get_value_match.return_value = default
+        self.nmlgen._definition.split_type_string.return_value = (var_type, None, 1)
+        xml_values = xml_values or {}
+        self.nmlgen._case = mock.Mock()
+        self.nmlgen._case.get_value.side_effect = xml_values.get
+        self.nmlgen._env_cache = None
+
+    def test_get_default_var_refs(self):
+        self._setup_get_default(["$DIN_LOC_ROOT/${GRID}/file_$GRID.nc"],
+                                xml_values={"DIN_LOC_ROOT": "/data", "GRID": "f19"})
+        self.assertEqual("/data/f19/file_f19.nc", self.nmlgen.get_default("foo"))
+
+    def test_get_default_sees_case_changes(self):
+        self._setup_get_default(["$DIN_LOC_ROOT/$DIN_LOC_ROOT"],
+                                xml_values={"DIN_LOC_ROOT": "/data"})
+        self.assertEqual("/data//data", self.nmlgen.get_default("foo"))
+        self.nmlgen._case.get_value.side_effect = {"DIN_LOC_ROOT": "/new"}.get
+        self.assertEqual("/new//new", self.nmlgen.get_default("foo"))
+
+    def test_init_defaults_caches_var_refs(self):
+        self._setup_get_default(["$DIN_LOC_ROOT/$DIN_LOC_ROOT"],
+                                xml_values={"DIN_LOC_ROOT": "/data"})
+        self.nmlgen._namelist = mock.Mock()
+        self.nmlgen._streams_namelists = {"streams": []}
+        self.nmlgen._definition.set_nodes.return_value = ["foo", "bar"]
+        self.nmlgen._definition.get.side_effect = lambda entry, _: entry
+        self.nmlgen._definition.get_group_name.return_value = "foo_nml"
+        defaults = []
+        with mock.patch.object(self.nmlgen, "add_default",
+                               side_effect=lambda name: defaults.append(self.nmlgen.get_default(name))):
+            self.nmlgen.init_defaults([], None)
+
+        self.assertEqual(["/data//data", "/data//data"], defaults)
+        self.nmlgen._case.get_value.assert_called_once_with("DIN_LOC_ROOT")
+        self.assertIsNone(self.nmlgen._env_cache)
+
+    def test_get_default_unknown_var_ref(self):
+        self._setup_get_default(["$NTASKS/$UNKNOWN"], var_type="integer",
+                                xml_values={"NTASKS": 4})
+        with self.assertLogs("CIME.nmlgen", level="WARNING"):
+            self.assertEqual("", self.nmlgen.get_default("foo"))
+
+    def test_get_default_nested_var_refs(self):
+        self._setup_get_default(["$A/f"], xml_values={"A": "$B/x", "B": "/b"})
+        self.assertEqual("/b/x/f", self.nmlgen.get_default("foo"))
+
+    def test_get_default_unknown_nested_var_ref(self):
+        self._setup_get_default(["$A/$D"], var_type="integer", xml_values={"A": "$C", "D": 1})
+        with self.assertLogs("CIME.nmlgen", level="WARNING") as cm:
+            self.assertEqual("", self.nmlgen.get_default("foo"))
+        self.assertIn("unknown XML variable C", cm.output[0])
+        # The scalar is dropped at the first unknown variable
+        self.assertNotIn(mock.call("D"), self.nmlgen._case.get_value.call_args_list)
+
+    def test_get_default_single_quoted(self):
+        self._setup_get_default(["'$DIN_LOC_ROOT'"],
+                                xml_values={"DIN_LOC_ROOT": "/data"})
+        self.assertEqual("$DIN_LOC_ROOT", self.nmlgen.get_default("foo"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
 import os
+import shutil
+import tempfile
+import threading
 import unittest
 from unittest import mock
 
+from CIME import test_scheduler
 from CIME.test_scheduler import TestScheduler
+from CIME.test_status import TestStatus, TEST_PASS_STATUS, TEST_PEND_STATUS, TEST_FAIL_STATUS
+from CIME.utils import CIMEError
 
 class TestTestScheduler(unittest.TestCase):
 
@@ -25,3 +31,259 @@ class TestTestScheduler(unittest.TestCase):
                 "RUN",
                 from_dir="/tests/SEQ_Ln9.f19_g16_rx1.A.cori-haswell_gnu.00:00:00",
             )
+
+    @mock.patch.dict(test_scheduler._TIME_CACHE, clear=True) # pylint: disable=protected-access
+    @mock.patch("CIME.test_scheduler.get_recommended_test_time", return_value=None)
+    @mock.patch("CIME.test_scheduler.get_recommended_test_time_based_on_past")
+    def test_order_tests_by_runtime(self, based_on_past, _):
+        based_on_past.side_effect = lambda _, test, raw: {"A": "00:10:00", "B": "01:00:00"}.get(test)
+        tests = ["A", "B", "C"]
+        test_scheduler._order_tests_by_runtime(tests, "/baselines") # pylint: disable=protected-access
+        self.assertEqual(["C", "B", "A"], tests)
+
+        # Cached raw estimates are not handed back for other forms of the estimate
+        self.assertEqual("01:00:00", test_scheduler._get_time_est("B", "/baselines", use_cache=True)) # pylint: disable=protected-access
+        self.assertEqual(4, based_on_past.call_count)
+        self.assertEqual("01:00:00", test_scheduler._get_time_est("B", "/baselines", use_cache=True)) # pylint: disable=protected-access
+        self.assertEqual(4, based_on_past.call_count)
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    def test_existing_baselines(self):
+        baseline_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, baseline_root)
+        existing = os.path.join(baseline_root, "gen", "SEQ_Ln9.f19_g16_rx1.A.cori-haswell_gnu")
+        os.makedirs(existing)
+        tests = ["SEQ_Ln9.f19_g16_rx1.A.cori-haswell_gnu", "SMS.f19_g16_rx1.A.cori-haswell_gnu"]
+
+        with self.assertRaisesRegex(CIMEError, "Baseline directories already exists") as cm:
+            TestScheduler(tests, machine_name="cori-haswell", test_root="/tests",
+                          baseline_root=baseline_root, baseline_gen_name="gen")
+        self.assertIn(existing, str(cm.exception))
+        self.assertNotIn("SMS", str(cm.exception))
+
+        ts = TestScheduler(tests, machine_name="cori-haswell", test_root="/tests", test_id="foo",
+                           baseline_root=baseline_root, baseline_gen_name="gen",
+                           allow_baseline_overwrite=True)
+        self.assertEqual("/tests/SMS.f19_g16_rx1.A.cori-haswell_gnu.G.foo",
+                         ts._get_test_dir(tests[1])) # pylint: disable=protected-access
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    @mock.patch("time.strftime", return_value="00:00:00")
+    def test_create_newcase_cmd(self, strftime): # pylint: disable=unused-argument
+        test = "SMS_D_P4_N2.f19_g16_rx1.A.cori-haswell_gnu"
+        ts = TestScheduler([test], machine_name="cori-haswell", test_root="/tests",
+                           project="proj", walltime="01:00:00")
+
+        with mock.patch.object(ts, "_shell_cmd_for_phase") as _shell_cmd_for_phase:
+            ts._create_newcase_phase(test) # pylint: disable=protected-access
+
+        _shell_cmd_for_phase.assert_called_once_with(
+            test,
+            "{} --case /tests/{}.00:00:00 --res f19_g16_rx1 --compset A --test"
+            " --machine cori-haswell --compiler gnu --project proj"
+            " --pecount 4 --ninst 2 --walltime 01:00:00".format(
+                os.path.join(ts._cime_root, "scripts", "create_newcase"), test), # pylint: disable=protected-access
+            "CREATE_NEWCASE",
+        )
+
+    def test_translate_test_names_for_new_pecount(self):
+        tests = ["SMS_D_P4x2.f19_g16_rx1.A.melvin_gnu", "SMS_P4.f19_g16_rx1.A.melvin_gnu",
+                 "SMS_D.f19_g16_rx1.A.melvin_gnu", "SMS.f19_g16_rx1.A.melvin_gnu"]
+        self.assertEqual(
+            test_scheduler._translate_test_names_for_new_pecount(tests, None, "3"), # pylint: disable=protected-access
+            ["SMS_D_P4x3.f19_g16_rx1.A.melvin_gnu", "SMS_P4x3.f19_g16_rx1.A.melvin_gnu",
+             "SMS_D_PMx3.f19_g16_rx1.A.melvin_gnu", "SMS_PMx3.f19_g16_rx1.A.melvin_gnu"])
+        self.assertEqual(
+            test_scheduler._translate_test_names_for_new_pecount(tests, "8", None), # pylint: disable=protected-access
+            ["SMS_D_P8x2.f19_g16_rx1.A.melvin_gnu", "SMS_P8.f19_g16_rx1.A.melvin_gnu",
+             "SMS_D_P8.f19_g16_rx1.A.melvin_gnu", "SMS_P8.f19_g16_rx1.A.melvin_gnu"])
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    def test_existing_test_dir(self):
+        test_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_root)
+        test = "SEQ_Ln9.f19_g16_rx1.A.cori-haswell_gnu"
+        TestScheduler([test], machine_name="cori-haswell", test_root=test_root, test_id="foo")
+
+        os.makedirs(os.path.join(test_root, "{}.foo".format(test)))
+        with self.assertRaisesRegex(CIMEError, "already exists"):
+            TestScheduler([test], machine_name="cori-haswell", test_root=test_root, test_id="foo")
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    def test_use_existing(self):
+        test_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_root)
+        test = "SEQ_Ln9.f19_g16_rx1.A.cori-haswell_gnu"
+        test_dir = os.path.join(test_root, "{}.foo".format(test))
+        os.makedirs(test_dir)
+        with TestStatus(test_dir=test_dir, test_name=test) as ts:
+            ts.set_status("CREATE_NEWCASE", TEST_PASS_STATUS)
+            ts.set_status("XML", TEST_PASS_STATUS)
+            ts.set_status("SETUP", TEST_FAIL_STATUS)
+
+        ts = TestScheduler([test], machine_name="cori-haswell", test_root=test_root, test_id="foo",
+                           use_existing=True)
+
+        self.assertEqual(("XML", TEST_PASS_STATUS), ts._get_test_data(test)) # pylint: disable=protected-access
+        self.assertEqual(TEST_PEND_STATUS, TestStatus(test_dir=test_dir).get_status("SETUP"))
+
+    def test_find_teststatus_files(self):
+        test_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_root)
+        test = "SEQ_Ln9.f19_g16_rx1.A.cori-haswell_gnu"
+        ts = TestScheduler([test], machine_name="cori-haswell", test_root=test_root, test_id="foo")
+
+        for case_id in ["{}.foo".format(test), "{}.G.foo".format(test), ".hidden.foo", "nostatus.foo", "other.bar"]:
+            os.makedirs(os.path.join(test_root, case_id))
+            if case_id != "nostatus.foo":
+                open(os.path.join(test_root, case_id, "TestStatus"), "w").close()
+        open(os.path.join(test_root, "file.foo"), "w").close()
+
+        expected = [os.path.join(test_root, case_id, "TestStatus")
+                    for case_id in ["{}.foo".format(test), "{}.G.foo".format(test)]]
+        self.assertEqual(sorted(expected), sorted(ts._find_teststatus_files())) # pylint: disable=protected-access
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    @mock.patch("CIME.test_scheduler.Files")
+    def test_find_test_mod_file(self, files):
+        testmods_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, testmods_dir)
+        os.makedirs(os.path.join(testmods_dir, "allactive", "foo"))
+        files.return_value.get_value.return_value = testmods_dir
+        tests = ["SMS.f19_g16_rx1.A.cori-haswell_gnu.allactive-foo",
+                 "ERS.f19_g16_rx1.A.cori-haswell_gnu.allactive-foo--allactive-bar"]
+        ts = TestScheduler(tests, machine_name="cori-haswell", test_root="/tests")
+
+        with mock.patch.object(ts, "_shell_cmd_for_phase") as _shell_cmd_for_phase, \
+             mock.patch.object(ts, "_log_output") as _log_output:
+            ts._create_newcase_phase(tests[0]) # pylint: disable=protected-access
+            success, error = ts._create_newcase_phase(tests[1]) # pylint: disable=protected-access
+
+        self.assertIn("--user-mods-dir {}".format(os.path.join(testmods_dir, "allactive", "foo")),
+                      _shell_cmd_for_phase.call_args_list[0][0][1])
+        self.assertFalse(success)
+        self.assertIn("Missing testmod file 'bar'", error)
+        _log_output.assert_called_once_with(tests[1], error)
+        # allactive/foo was only looked up once, each lookup with its own Files object
+        self.assertEqual(2, files.call_count)
+        self.assertEqual(3, files.return_value.get_value.call_count)
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    @mock.patch("time.sleep")
+    @mock.patch("CIME.test_scheduler.run_cmd")
+    def test_shell_cmd_for_phase_bad_interpreter(self, run_cmd, sleep):
+        test = "SEQ_Ln9.f19_g16_rx1.A.cori-haswell_gnu"
+        ts = TestScheduler([test], machine_name="cori-haswell", test_root="/tests")
+        run_cmd.side_effect = [(1, "bad interpreter", "err"), (0, "ok", "")]
+
+        with mock.patch.object(ts, "_log_output"), self.assertLogs("CIME.test_scheduler", level="WARNING"):
+            self.assertEqual((True, ""), ts._shell_cmd_for_phase(test, "./case.setup", "SETUP")) # pylint: disable=protected-access
+        sleep.assert_called_once_with(0.1)
+
+        run_cmd.side_effect = None
+        run_cmd.return_value = (1, "bad interpreter", "err")
+        with mock.patch.object(ts, "_log_output"), self.assertLogs("CIME.test_scheduler", level="WARNING"):
+            self.assertEqual((False, "err"), ts._shell_cmd_for_phase(test, "./case.setup", "SETUP")) # pylint: disable=protected-access
+        # Two calls above, then one try plus five retries
+        self.assertEqual(8, run_cmd.call_count)
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    def test_get_build_group(self):
+        tests = ["SMS.f19_g16_rx1.A.cori-haswell_gnu", "ERS.f19_g16_rx1.A.cori-haswell_gnu"]
+        ts = TestScheduler(tests, machine_name="cori-haswell", test_root="/tests")
+        self.assertEqual((True, tests[1], (tests[1],)), ts._get_build_group(tests[1])) # pylint: disable=protected-access
+        with self.assertRaisesRegex(CIMEError, "No build group"):
+            ts._get_build_group("foo") # pylint: disable=protected-access
+
+        ts = TestScheduler(tests, machine_name="cori-haswell", test_root="/tests", single_exe=True)
+        self.assertEqual((True, tests[0], tuple(tests)), ts._get_build_group(tests[0])) # pylint: disable=protected-access
+        self.assertEqual((False, tests[0], tuple(tests)), ts._get_build_group(tests[1])) # pylint: disable=protected-access
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    def test_create_newcase_cmd_test_options(self):
+        tests = ["SMS.f19_g16_rx1.A.cori-haswell_gnu", "ERS.f19_g16_rx1.A.cori-haswell_gnu"]
+        test_data = {tests[0]: {"options": {"wallclock": "00:20:00", "workflow": "foo"}},
+                     tests[1]: {"options": None}}
+        ts = TestScheduler(tests, test_data=test_data, machine_name="cori-haswell", test_root="/tests")
+
+        with mock.patch.object(ts, "_shell_cmd_for_phase") as _shell_cmd_for_phase:
+            ts._create_newcase_phase(tests[0]) # pylint: disable=protected-access
+            ts._create_newcase_phase(tests[1]) # pylint: disable=protected-access
+
+        self.assertTrue(_shell_cmd_for_phase.call_args_list[0][0][1].endswith(" --walltime 00:20:00 --workflow foo"))
+        self.assertNotIn("--walltime", _shell_cmd_for_phase.call_args_list[1][0][1])
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    @mock.patch("CIME.test_scheduler.Case")
+    @mock.patch("CIME.test_scheduler.lock_file")
+    @mock.patch("CIME.test_scheduler.Tests")
+    @mock.patch("CIME.test_scheduler.Component")
+    @mock.patch("CIME.test_scheduler.Files")
+    @mock.patch("CIME.test_scheduler.EnvTest")
+    def test_xml_phase_case_opts(self, env_test, files, component, tests, *_):
+        test = "ERS_D_Ln9_A4x2_P4_IOP.f19_g16_rx1.A.cori-haswell_gnu"
+        pts_test = "SMS_R.f19_g16_rx1.A.cori-haswell_gnu"
+        bad_test = "ERS_Z.f19_g16_rx1.A.cori-haswell_gnu"
+        ts = TestScheduler([test, pts_test, bad_test], machine_name="cori-haswell", test_root="/tests")
+        files.return_value.get_value.return_value = __file__
+
+        self.assertEqual((True, ""), ts._xml_phase(test)) # pylint: disable=protected-access
+
+        env_test.return_value.set_test_parameter.assert_has_calls([
+            mock.call("DEBUG", "TRUE"),
+            mock.call("STOP_OPTION", "nsteps"),
+            mock.call("STOP_N", "9"),
+            mock.call("PIO_ASYNC_INTERFACE", "TRUE"),
+            mock.call("CIME_DRIVER", "nuopc"),
+            mock.call("PIO_VERSION", "2"),
+            mock.call("PIO_NUMTASKS_CPL", "4"),
+            mock.call("PIO_STRIDE_CPL", "2"),
+        ])
+        self.assertEqual(8, env_test.return_value.set_test_parameter.call_count)
+
+        env_test.reset_mock()
+        self.assertEqual((True, ""), ts._xml_phase(pts_test)) # pylint: disable=protected-access
+        set_test_parameter = env_test.return_value.set_test_parameter
+        self.assertEqual(26, set_test_parameter.call_count)
+        set_test_parameter.assert_any_call("NTASKS_WAV", "1")
+        set_test_parameter.assert_any_call("ROOTPE_ATM", "0")
+        set_test_parameter.assert_called_with("PIO_TYPENAME", "netcdf")
+
+        with self.assertRaisesRegex(CIMEError, "Could not parse option 'Z'"):
+            ts._xml_phase(bad_test) # pylint: disable=protected-access
+
+        # Files lookups change its state, so each phase reads its own driver
+        # config; config_tests.xml is only read once
+        self.assertEqual([mock.call(comp_interface="mct")] * 3, files.call_args_list)
+        self.assertEqual([mock.call(__file__, "CPL")] * 3, component.call_args_list)
+        tests.assert_called_once_with()
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    @mock.patch("CIME.test_scheduler.append_status")
+    def test_producer(self, _):
+        tests = ["SMS.f19_g16_rx1.A.cori-haswell_gnu", "ERS.f19_g16_rx1.A.cori-haswell_gnu",
+                 "ERP.f19_g16_rx1.A.cori-haswell_gnu"]
+        ts = TestScheduler(tests, machine_name="cori-haswell", test_root="/tests",
+                           no_setup=True, parallel_jobs=2)
+
+        with mock.patch.object(ts, "_create_newcase_phase", return_value=(True, "")), \
+             mock.patch.object(ts, "_xml_phase", side_effect=[(True, ""), (False, "bad"), (True, "")]), \
+             mock.patch.object(ts, "_update_test_status_file"), \
+             mock.patch.object(ts, "_log_output"):
+            ts._producer() # pylint: disable=protected-access
+
+        statuses = [ts._get_test_data(test) for test in tests] # pylint: disable=protected-access
+        self.assertEqual(2, statuses.count(("XML", TEST_PASS_STATUS)))
+        self.assertEqual(1, statuses.count(("XML", TEST_FAIL_STATUS)))
+        self.assertEqual(1, threading.active_count())
+
+    @mock.patch.dict(os.environ, {"CIME_MODEL": "cesm"})
+    @mock.patch("CIME.test_scheduler.EnvMachPes")
+    def test_get_procs_needed_run(self, env_mach_pes):
+        test = "SMS.f19_g16_rx1.A.cori-haswell_gnu"
+        ts = TestScheduler([test], machine_name="cori-haswell", test_root="/tests", test_id="foo")
+        env_mach_pes.return_value.get_value.return_value = 32
+
+        self.assertEqual(32, ts._get_procs_needed(test, "RUN", no_batch=True)) # pylint: disable=protected-access
+        self.assertEqual(32, ts._get_procs_needed(test, "RUN", no_batch=True)) # pylint: disable=protected-access
+        env_mach_pes.assert_called_once_with("/tests/{}.foo".format(test), read_only=True)